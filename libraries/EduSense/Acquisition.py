@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import deque
+from timeit import default_timer as timer
+
+import numpy as np
+
+from libraries.EduSense import Uart
+
+# Continuous reading of analog pin of expander, as fast as link allows. Samples (time, voltage) are kept in ring
+# buffer, so long capture takes always the same memory - only the newest <capacity> samples are kept:
+#
+#   acquisition = Acquisition(port, 1)
+#   acquisition.start()
+#   ...
+#   times, voltages = acquisition.buffer.get(since=acquisition.buffer.time_get() - 5)  # the last 5 seconds
+#   acquisition.buffer.save("capture.csv")   # or .npz
+#
+# Reading is done by separate thread. If port is used by game in the meantime (i.e. by Dashboard or LedMatrix),
+# turn on pipeline mode first (Uart.pipeline_start) - without it, port can't be used by two threads.
+# In pipeline mode few readings wait for answer at the same time, so there are more samples per second.
+
+ACQUISITION_CAPACITY = 65536  # samples kept in buffer
+ACQUISITION_IN_FLIGHT = 4  # readings sent without waiting for answer (pipeline mode only)
+ACQUISITION_RETRY_TIME = 0.1  # [s] wait, when port isn't open or there was no answer
+
+
+# Ring buffer of samples with their times. Times are in seconds since creation of buffer
+class SampleBuffer:
+    def __init__(self, capacity=ACQUISITION_CAPACITY):
+        if capacity < 1:
+            raise ValueError("Capacity of buffer must be positive")
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._values = np.zeros(capacity, dtype=np.float32)
+        self._count = 0  # all samples put into buffer, also the ones already overwritten
+        self._lock = threading.Lock()
+        self._origin = timer()
+
+    @property
+    def capacity(self):
+        return len(self._values)
+
+    # how many samples were put into buffer since it was created (or cleared)
+    @property
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    # time now, in the same units as times of samples
+    def time_get(self):
+        return timer() - self._origin
+
+    def append(self, value, sample_time=None):
+        if sample_time is None:
+            sample_time = self.time_get()
+        with self._lock:
+            index = self._count % self.capacity
+            self._times[index] = sample_time
+            self._values[index] = value
+            self._count += 1
+
+    def clear(self):
+        with self._lock:
+            self._count = 0
+            self._origin = timer()
+
+    # copy of samples (times, values), the oldest first. With <since>, only samples not older than it
+    def get(self, since=None):
+        with self._lock:
+            start = self._count % self.capacity
+            if self._count <= self.capacity:
+                times = self._times[:self._count].copy()
+                values = self._values[:self._count].copy()
+            else:
+                times = np.concatenate((self._times[start:], self._times[:start]))
+                values = np.concatenate((self._values[start:], self._values[:start]))
+        if since is not None:
+            first = np.searchsorted(times, since)
+            times, values = times[first:], values[first:]
+        return times, values
+
+    # save samples for analysis in other programs: .npz (numpy) or text file with two columns (csv)
+    def save(self, path, since=None):
+        times, values = self.get(since)
+        if str(path).lower().endswith(".npz"):
+            np.savez(path, times=times, values=values)
+        else:
+            data = np.column_stack((times, values))
+            np.savetxt(path, data, fmt=("%.6f", "%.4f"), delimiter=",", header="time [s],voltage [V]", comments="")
+
+
+class Acquisition:
+    def __init__(self, port, pin, capacity=ACQUISITION_CAPACITY, in_flight=ACQUISITION_IN_FLIGHT):
+        if pin != 1 and pin != 2:
+            raise ValueError("Incorrect pin number")
+        self._port = port
+        self._pin = pin
+        self.in_flight = in_flight
+        self.buffer = SampleBuffer(capacity)
+        self.errors = 0
+        self._thread = None
+        self._running = False
+
+    @property
+    def pin_number(self):
+        return self._pin
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self.__run, name="Acquisition", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._running = False
+        self._thread.join()
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None
+
+    # samples per second, counted from the last <period> seconds of buffer
+    def rate_get(self, period=1.0):
+        times, _ = self.buffer.get(since=self.buffer.time_get() - period)
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def __run(self):
+        waiting = deque()  # (time of sending, future)
+        while self._running:
+            if not self._port.is_open():
+                waiting.clear()
+                time.sleep(ACQUISITION_RETRY_TIME)
+                continue
+
+            # without pipeline mode answer is ready at once, so only one reading is waiting
+            in_flight = self.in_flight if getattr(self._port, "is_pipelined", lambda: False)() else 1
+            while len(waiting) < in_flight:
+                waiting.append((self.buffer.time_get(), self._port.send_async("EXP_ADC_GET", [self._pin])))
+
+            sent_time, future = waiting.popleft()
+            is_ok, results = future.result()
+            if is_ok and Uart.rx_error_get(results) == 0:
+                # pin was read somewhere between sending and answer
+                self.buffer.append(results[1] / 1000, (sent_time + self.buffer.time_get()) / 2)  # [mV] -> [V]
+            else:
+                self.errors += 1
+            if not is_ok:
+                # no answer (i.e. reader of pipeline stopped, while port looks open) - don't try again at once
+                waiting.clear()
+                time.sleep(ACQUISITION_RETRY_TIME)
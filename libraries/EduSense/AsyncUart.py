@@ -0,0 +1,283 @@
+import asyncio
+
+import serial
+
+from libraries.EduSense import General
+from libraries.EduSense import Settings
+from libraries.EduSense import Uart
+
+ASYNC_READ_POLL_TIME = 0.05  # [s] read timeout, if port has to be read by thread (no add_reader, i.e. on Windows)
+
+
+# asyncio counterpart of Uart. It uses the same protocol tables (Uart.uart_codecs), but never blocks on port.
+# Many commands can wait for answer at the same time, answers are matched with requests by frame counter.
+# Port is read when event loop says it has data (loop.add_reader), or by thread of executor, where it isn't possible.
+class AsyncUart:
+    def __init__(self, max_in_flight=8):
+        self._port = None
+        self._loop = None
+        self._read_task = None  # only when port is read by executor
+        self._parser = Uart.FrameParser()
+        self._frame_cnt = 0
+        self._pending = {}  # frame counter -> [future, command name]
+        self._in_flight = asyncio.Semaphore(max(1, min(max_in_flight, 255)))
+
+    async def open(self, device=None):
+        loop = asyncio.get_running_loop()
+        if device is None:
+            # enumeration of ports can take a while, so it isn't done in event loop
+            device = await loop.run_in_executor(None, Uart.device_find)
+            if device is None:
+                print("Pad not found. Please, check USB connection")
+                return False
+        try:
+            port = await loop.run_in_executor(None, lambda: serial.Serial(device, timeout=0))
+        except (serial.SerialException, OSError, ValueError):
+            print("Unable to open port:", device)
+            return False
+        print("Device connected to port:", device)
+        self._port = port
+        self._loop = loop
+        self._parser.reset()
+        try:
+            loop.add_reader(port.fileno(), self.__port_readable)
+        except (AttributeError, NotImplementedError):
+            port.timeout = ASYNC_READ_POLL_TIME
+            self._read_task = loop.create_task(self.__read_loop())
+        return True
+
+    async def close(self):
+        if self._read_task is not None:
+            self._read_task.cancel()
+            try:
+                await self._read_task
+            except asyncio.CancelledError:
+                pass
+            self._read_task = None
+        self.__port_close()
+
+    def is_open(self):
+        return self._port is not None and self._port.is_open
+
+    # (is_ok, results) of command. Error reported by pad is in results of this command (see Uart.rx_error_get),
+    # so every coroutine gets its own, even if many of them wait at the same time
+    async def send(self, cmd_name, *dane_in):
+        datas = General.vars_to_list(*dane_in)
+        if not self.is_open():
+            return False, []
+
+        async with self._in_flight:  # don't overflow device, if too many frames are waiting for answer
+            if not self.is_open():  # port could be lost while waiting
+                return False, []
+            self._frame_cnt = (self._frame_cnt + 1) % 256
+            frame_cnt = self._frame_cnt
+            frame = Uart.frame_build(frame_cnt, cmd_name, datas)
+            if frame is None:
+                return False, []
+
+            future = self._loop.create_future()
+            self._pending[frame_cnt] = [future, cmd_name]
+            try:
+                self._port.write(frame)
+                return await asyncio.wait_for(future, Uart.UART_WAIT_TIME_FOR_ANSWER)
+            except Uart._PORT_ERRORS:
+                self.__port_lost()
+                return False, []
+            except asyncio.TimeoutError:
+                return False, []
+            finally:
+                self._pending.pop(frame_cnt, None)
+
+    # called by event loop, when there is something to read
+    def __port_readable(self):
+        try:
+            received = self._port.read(self._port.in_waiting or 1)
+        except Uart._PORT_ERRORS:
+            self.__port_lost()
+            return
+        self.__frames_handle(received)
+
+    async def __read_loop(self):
+        while self.is_open():
+            try:
+                received = await self._loop.run_in_executor(None, self.__port_read)
+            except Uart._PORT_ERRORS:
+                self.__port_lost()
+                return
+            self.__frames_handle(received)
+
+    def __port_read(self):
+        # wait (on port timeout) for first char, then take at once everything what is waiting
+        return self._port.read(self._port.in_waiting or 1)
+
+    def __frames_handle(self, received):
+        for frame in self._parser.feed(received):
+            if len(frame) < 6:  # STX, frame counter, command, ETX
+                continue
+            pending = self._pending.pop(Uart.frame_cnt_get(frame), None)
+            if pending is None or pending[0].done():
+                print("Error: received unexpected frame numer:{}".format(Uart.frame_cnt_get(frame)))
+                continue
+            future, cmd_name = pending
+            future.set_result(Uart.frame_get_values(cmd_name, frame[5:-1]))
+
+    # port stopped working (end of file or error): it is closed, so nobody waits for answers, which won't come
+    def __port_lost(self):
+        print("Error: connection with pad lost")
+        self.__port_close()
+
+    def __port_close(self):
+        port, self._port = self._port, None
+        if port is not None:
+            if self._read_task is None:
+                try:
+                    self._loop.remove_reader(port.fileno())
+                except (AttributeError, NotImplementedError, ValueError, OSError):
+                    pass
+            try:
+                port.close()
+            except Uart._PORT_ERRORS:
+                pass
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.set_result((False, []))
+        self._pending.clear()
+
+    async def __cmd_status(self, cmd_name, *data):
+        is_ok, results = await self.send(cmd_name, *data)
+        return is_ok and Uart.rx_error_get(results) == 0
+
+    async def __cmd_values(self, cmd_name, *data):
+        is_ok, results = await self.send(cmd_name, *data)
+        if is_ok and Uart.rx_error_get(results) == 0:
+            results.pop(0)
+            return True, results
+        else:
+            return False, []
+
+    # get firmware version
+    async def cmd_pad_status(self):
+        return await self.__cmd_values("PAD_STATUS")
+
+    # turn on LED on matrix
+    async def cmd_led_turn_on(self, x, y):
+        if not Uart.led_coords_check(x, y):
+            return False
+        return await self.__cmd_status("LED_ON", x, y)
+
+    # turn off LED on matrix
+    async def cmd_led_turn_off(self, x, y):
+        if not Uart.led_coords_check(x, y):
+            return False
+        return await self.__cmd_status("LED_OFF", x, y)
+
+    # store data on LED matrix column by column
+    async def cmd_matrix_by_columns(self, *data):
+        return await self.__cmd_status("LED_MATRIX", *data)
+
+    # store data on LED matrix row by row
+    async def cmd_matrix_by_rows(self, *data):
+        return await self.__cmd_status("LED_MATRIX", Uart.matrix_rows_to_columns(*data))
+
+    # set global LED matrix intensity
+    async def cmd_led_intensity(self, value):
+        if value > Settings.MATRIX_INTENSITY_MAX:
+            value = Settings.MATRIX_INTENSITY_MAX
+        return await self.__cmd_status("LED_INTENSITY", value)
+
+    # get position of joystick axes
+    async def cmd_joystick_get(self):
+        is_ok, results = await self.send("JOYSTICK_GET")
+
+        if is_ok and results[:1] == ['D']:
+            return True, Uart.joystick_axes_get(results)
+        else:
+            return False, []
+
+    # get status of all buttons on pad: UP, DOWN, LEFT, RIGHT, OK, JOY
+    async def cmd_buttons_get(self):
+        is_ok, results = await self.send("BUTTONS_GET")
+
+        if is_ok and results[:1] == ['D']:
+            results.pop(0)
+            return True, results
+        else:
+            return False, []
+
+    # get status of one button on pad
+    async def cmd_button_get(self, color):
+        is_ok, results = await self.cmd_buttons_get()
+
+        if is_ok:
+            return True, [results[color]]
+        else:
+            return False, []
+
+    # set some tones to play by pad
+    async def cmd_sound_play(self, *data):
+        return await self.__cmd_status("SOUND_PLAY", *data)
+
+    # write data (turn on and off) to virtual screen
+    async def cmd_virt_write(self, *data):
+        return await self.__cmd_status("VIRT_WRITE", Uart.virt_params_limit(*data))
+
+    # turn on (only) data to virtual screen
+    async def cmd_virt_on(self, *data):
+        return await self.__cmd_status("VIRT_ON", Uart.virt_params_limit(*data))
+
+    # turn off (only) data to virtual screen
+    async def cmd_virt_off(self, *data):
+        return await self.__cmd_status("VIRT_OFF", Uart.virt_params_limit(*data))
+
+    # toggle data on virtual screen
+    async def cmd_virt_toggle(self, *data):
+        return await self.__cmd_status("VIRT_TOGGLE", Uart.virt_params_limit(*data))
+
+    # fill (1) or clear (0) whole virtual screen
+    async def cmd_virt_fill(self, onoff):
+        return await self.__cmd_status("VIRT_FILL", int(onoff != 0))
+
+    # show part of virtual screen on LED matrix
+    async def cmd_virt_show(self, *data):
+        return await self.__cmd_status("VIRT_SHOW", Uart.virt_show_params_limit(*data))
+
+    # assign specific function to pin in expander
+    async def cmd_exp_fn_set(self, *data):
+        if not Uart.exp_pin_check(data[0]):
+            return False
+        return await self.__cmd_status("EXP_FN_SET", *data)
+
+    # turn on/off power (+5V) on expander
+    async def cmd_exp_pwr_set(self, onoff):
+        return await self.__cmd_status("EXP_PWR_SET", int(onoff != 0))
+
+    # get status of power pin on expander (on/off, overload)
+    async def cmd_exp_pwr_status(self):
+        return await self.__cmd_values("EXP_PWR_STATUS")
+
+    # get pin state used as digital input
+    async def cmd_exp_io_in_get(self, *data):
+        if not Uart.exp_pin_check(data[0]):
+            return False
+        return await self.__cmd_values("EXP_IO_IN_GET", data[0])
+
+    # set pin state used as digital output
+    async def cmd_exp_io_out_set(self, *data):
+        param_list = General.vars_to_list(*data)
+        if not Uart.exp_pin_check(param_list[0]):
+            return False
+        param_list[1] = int(param_list[1] != 0)
+        return await self.__cmd_status("EXP_IO_OUT_SET", param_list)
+
+    # get analog value (voltage in [mV]) on pin of expander
+    async def cmd_exp_adc_get(self, *data):
+        if not Uart.exp_pin_check(data[0]):
+            return False
+        return await self.__cmd_values("EXP_ADC_GET", data[0])
+
+    # set analog value (voltage in [mV]) on pin of expander
+    async def cmd_exp_dac_set(self, *data):
+        param_list = General.vars_to_list(*data)
+        if not Uart.exp_pin_check(param_list[0]):
+            return False
+        return await self.__cmd_status("EXP_DAC_SET", param_list)
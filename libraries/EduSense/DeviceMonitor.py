@@ -0,0 +1,90 @@
+import threading
+from timeit import default_timer as timer
+
+from libraries.EduSense import Uart
+
+DEVICE_POLL_TIME = 1.0  # [s] how often list of serial ports is checked
+
+# Watches (in background thread) if pad is connected to USB, so cable can be pulled out and plugged in again
+# while game is running. Searching of ports is slow, so it's never done in game loop:
+#
+#   monitor = DeviceMonitor()
+#   monitor.start()
+#   ...
+#   if monitor.update(port):   # in game loop, port is Uart.Uart
+#       port.pipeline_start()  # port was opened (again), i.e. restore state of pad here
+#
+# Joystick part of pad is followed by Joystick.update (JOYDEVICEADDED/JOYDEVICEREMOVED events).
+
+
+class DeviceMonitor:
+    def __init__(self, poll_time=DEVICE_POLL_TIME, finder=Uart.device_find):
+        self.poll_time = poll_time
+        self._finder = finder  # function which returns port of pad or None
+        self._device = None
+        self._scanned = threading.Event()  # set after the first search
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+        self._next_open = 0
+        self._opened = None  # device opened by <update>, only this one is closed by it
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self.__run, name="Device monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._running = False
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+
+    # port of pad found by the last search, None if pad isn't connected (or wasn't searched yet)
+    def device_get(self):
+        return self._device
+
+    # wait for the first search (i.e. at start of program, if pad is needed before game starts)
+    def wait(self, timeout=None):
+        self._scanned.wait(timeout)
+        return self._device
+
+    # search again now, without waiting for <poll_time>
+    def rescan(self):
+        self._wake.set()
+
+    def __run(self):
+        while self._running:
+            device = self._finder()
+            if device != self._device:
+                if device is None:
+                    print("Pad disconnected")
+                else:
+                    print("Pad found on port:", device)
+                self._device = device
+            self._scanned.set()
+            self._wake.wait(self.poll_time)
+            self._wake.clear()
+
+    # run it periodically in game loop. It opens <port>, if pad is connected, and closes it, if pad opened by it
+    # disappeared (port opened by other code, i.e. of emulator, is never closed here).
+    # Opening of known port is quick, it doesn't search for it. Returns True, if port was opened now
+    def update(self, port):
+        device = self._device
+        if port.is_open():
+            if self._scanned.is_set() and device != self._opened and port.device_get() == self._opened:
+                port.close(wait=False)  # pad is gone, so there is no point in waiting for answers
+                self._opened = None
+            return False
+
+        if device is None or timer() < self._next_open:
+            return False
+        self._next_open = timer() + self.poll_time  # don't try too often, if port can't be opened
+        if port.open(device):
+            self._opened = device
+            return True
+        return False
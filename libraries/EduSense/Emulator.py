@@ -0,0 +1,332 @@
+import os
+import random
+import select
+import threading
+import time
+import tty
+from collections import deque
+
+from libraries.EduSense import Settings
+from libraries.EduSense import Uart
+
+# Software emulator of pad firmware. It speaks the whole protocol from Uart.uart_cmd_list over pseudo-terminal,
+# so Uart (and everything built on it) can be tested and benchmarked without hardware:
+#
+#   emulator = Emulator(latency=0.002, baudrate=115200)
+#   emulator.start()
+#   port = Uart.Uart()
+#   port.open(emulator.device)
+#
+# It can be run also as separate process: python -m libraries.EduSense.Emulator
+
+# error numbers sent by emulator (in frame like E01)
+ERROR_UNKNOWN_CMD = 1
+ERROR_WRONG_PARAM = 2
+ERROR_SOUND_QUEUE_FULL = 3
+ERROR_INJECTED = 0x0F
+
+EMU_FIRMWARE_VERSION = (1, 0, 0)
+EMU_SOUND_QUEUE_MAX = 64  # how many tones (not played yet) can wait in queue
+EMU_DAC_MAX = 3300  # [mV]
+
+_codecs_by_cmd = {x.cmd: x for x in Uart.uart_codecs.values()}
+
+
+class Emulator:
+    def __init__(self, latency=0.0, baudrate=None, error_rate=0.0, frame_cnt_error_rate=0.0, seed=None):
+        # [s] delay of every answer after its request came. Answers are scheduled, not processed one after another,
+        # so requests sent without waiting (Uart pipeline mode) are answered in overlapping time, like over real link
+        self.latency = latency
+        self.baudrate = baudrate  # None means no limit, otherwise frames wait for transmission, one after another
+        self.error_rate = error_rate  # probability of answer "E0F" instead of correct one
+        self.frame_cnt_error_rate = frame_cnt_error_rate  # probability of wrong frame counter in answer
+        self._random = random.Random(seed)
+
+        self._master = None
+        self._slave = None
+        self.device = None
+        self._thread = None
+        self._sender = None
+        self._running = False
+        self._parser = Uart.FrameParser()
+        self._lock = threading.Lock()
+        self._answers = deque()  # [time when answer is sent, answer], in order of time
+        self._answers_ready = threading.Condition()
+        self._rx_free = 0  # time when link is free for the next request (with baudrate)
+        self._tx_free = 0  # the same for answers
+
+        # statistics
+        self.frames_received = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.errors_injected = 0
+
+        self.reset()
+
+    # state of pad, like after power on
+    def reset(self):
+        with self._lock:
+            self.matrix = [0] * Settings.MATRIX_X_SIZE  # column by column, bit 0 is the top row
+            self.intensity = Settings.MATRIX_INTENSITY_MAX
+            self.virt_screen = [0] * Settings.VIRT_SCREEN_X_SIZE  # column by column, bit 0 is the top row
+            self.joystick = [0x80, 0x80]
+            self.buttons = [0] * 6  # UP, DOWN, LEFT, RIGHT, OK, JOY
+            self.exp_power = 0
+            self.exp_functions = {1: 0, 2: 0}
+            self.exp_outputs = {1: 0, 2: 0}
+            self.exp_inputs = {1: 0, 2: 0}  # state of pins used as digital inputs, can be set by test
+            self.exp_adc = {1: 0, 2: 0}  # [mV] voltage on pins used as analog inputs, can be set by test
+            self.exp_dac = {1: 0, 2: 0}  # [mV]
+            self._sound_queue = deque()  # [frequency, duration, end of playing]
+
+    def start(self):
+        if self._running:
+            return self.device
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.device = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self.__run, name="Pad emulator", daemon=True)
+        self._thread.start()
+        self._sender = threading.Thread(target=self.__send_run, name="Pad emulator sender", daemon=True)
+        self._sender.start()
+        return self.device
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._thread.join()
+        with self._answers_ready:
+            self._answers_ready.notify()
+        self._sender.join()
+        self._sender = None
+        self._answers.clear()
+        os.close(self._master)
+        os.close(self._slave)
+        self._thread = None
+        self.device = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    # tones, which are still playing or waiting in queue: [frequency, duration]
+    def sound_queue_get(self):
+        with self._lock:
+            self.__sound_queue_update()
+            return [x[:2] for x in self._sound_queue]
+
+    def __sound_queue_update(self):
+        now = time.monotonic()
+        while self._sound_queue and self._sound_queue[0][2] <= now:
+            self._sound_queue.popleft()
+
+    def __run(self):
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                received = os.read(self._master, 4096)
+            except OSError:
+                continue
+            receive_time = time.monotonic()
+            self.bytes_received += len(received)
+            for frame in self._parser.feed(received):
+                if len(frame) >= 6:
+                    self.__answer(frame, receive_time)
+
+    # answers are written when their time comes
+    def __send_run(self):
+        while True:
+            with self._answers_ready:
+                while self._running and not self._answers:
+                    self._answers_ready.wait()
+                if not self._running:
+                    return
+                send_time, answer = self._answers[0]
+            delay = send_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self._answers_ready:
+                self._answers.popleft()
+            try:
+                os.write(self._master, answer)
+            except OSError:
+                continue
+            self.bytes_sent += len(answer)
+
+    def __answer(self, frame, receive_time):
+        self.frames_received += 1
+        frame_cnt = Uart.frame_cnt_get(frame)
+        cmd = frame[3:5]
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors_injected += 1
+            data = b"E%02X" % ERROR_INJECTED
+        else:
+            with self._lock:
+                data = self.__execute(cmd, frame[5:-1])
+
+        if self.frame_cnt_error_rate and self._random.random() < self.frame_cnt_error_rate:
+            self.errors_injected += 1
+            frame_cnt = (frame_cnt + 1) % 256
+
+        answer = b"%c%02X%s%s%c" % (Uart.ASCII_STX, frame_cnt, cmd, data, Uart.ASCII_ETX)
+        send_time = receive_time + self.latency
+        if self.baudrate:
+            # every char is 8 bits of data + start + stop, and each direction sends one frame at a time
+            self._rx_free = max(receive_time, self._rx_free) + len(frame) * 10 / self.baudrate
+            send_time = max(self._rx_free + self.latency, self._tx_free) + len(answer) * 10 / self.baudrate
+            self._tx_free = send_time
+        with self._answers_ready:
+            self._answers.append([send_time, answer])
+            self._answers_ready.notify()
+
+    def __execute(self, cmd, data):
+        codec = _codecs_by_cmd.get(cmd)
+        if codec is None:
+            return b"E%02X" % ERROR_UNKNOWN_CMD
+        params = codec.decode_request(data)
+        handler = getattr(self, "_cmd_" + codec.name.lower())
+        try:
+            result = handler(*params)
+        except (IndexError, KeyError, TypeError, ValueError):
+            return b"E%02X" % ERROR_WRONG_PARAM
+        if isinstance(result, int):  # error number
+            return b"E%02X" % result
+        return codec.encode_answer(result or [])
+
+    # below are handlers of commands. They return list of values for answer or error number
+
+    def _cmd_pad_status(self):
+        return ['D', *EMU_FIRMWARE_VERSION]
+
+    def _cmd_led_on(self, *coords):
+        for x, y in zip(coords[0::2], coords[1::2]):
+            self.matrix[x] |= 1 << y
+
+    def _cmd_led_off(self, *coords):
+        for x, y in zip(coords[0::2], coords[1::2]):
+            self.matrix[x] &= ~(1 << y)
+
+    def _cmd_led_matrix(self, *columns):
+        for x, column in enumerate(columns[:Settings.MATRIX_X_SIZE]):
+            self.matrix[x] = column
+
+    def _cmd_led_intensity(self, value):
+        self.intensity = min(value, Settings.MATRIX_INTENSITY_MAX)
+
+    def _cmd_joystick_get(self):
+        return ['D', *self.joystick]
+
+    def _cmd_buttons_get(self):
+        return ['D', *self.buttons]
+
+    def _cmd_sound_play(self, *tones):
+        self.__sound_queue_update()
+        if len(self._sound_queue) + len(tones) // 2 > EMU_SOUND_QUEUE_MAX:
+            return ERROR_SOUND_QUEUE_FULL
+        start = self._sound_queue[-1][2] if self._sound_queue else time.monotonic()
+        for frequency, duration in zip(tones[0::2], tones[1::2]):
+            start += duration / 100  # duration is in 0,01s
+            self._sound_queue.append([frequency, duration, start])
+
+    # pixels of virtual screen operations are sent column by column, every column uses (height + 7) // 8 bytes,
+    # bit 0 of first byte is the top pixel. This layout is an assumption (the same one is used by VirtScreen),
+    # it isn't checked against real firmware - so emulator can't show, that VirtScreen sends pixels correctly
+    def __virt_operation(self, operation, x, y, width, height, roll, *pixels):
+        bytes_per_column = (height + 7) // 8
+        mask = (1 << height) - 1
+        full = (1 << Settings.VIRT_SCREEN_Y_SIZE) - 1
+        for i in range(width):
+            column_bytes = pixels[i * bytes_per_column: (i + 1) * bytes_per_column]
+            if not column_bytes:
+                break
+            bits = int.from_bytes(bytes(column_bytes), "little") & mask
+            column_mask = mask << y
+            bits <<= y
+            if roll:
+                # what is behind the bottom edge goes to the top
+                bits = (bits | bits >> Settings.VIRT_SCREEN_Y_SIZE) & full
+                column_mask = (column_mask | column_mask >> Settings.VIRT_SCREEN_Y_SIZE) & full
+                column = (x + i) % Settings.VIRT_SCREEN_X_SIZE
+            else:
+                bits &= full
+                column_mask &= full
+                column = x + i
+                if column >= Settings.VIRT_SCREEN_X_SIZE:
+                    break
+            self.virt_screen[column] = operation(self.virt_screen[column], bits, column_mask)
+
+    def _cmd_virt_write(self, *params):
+        self.__virt_operation(lambda old, bits, mask: (old & ~mask) | bits, *params)
+
+    def _cmd_virt_on(self, *params):
+        self.__virt_operation(lambda old, bits, mask: old | bits, *params)
+
+    def _cmd_virt_off(self, *params):
+        self.__virt_operation(lambda old, bits, mask: old & ~bits, *params)
+
+    def _cmd_virt_toggle(self, *params):
+        self.__virt_operation(lambda old, bits, mask: old ^ bits, *params)
+
+    def _cmd_virt_fill(self, onoff):
+        self.virt_screen = [(1 << Settings.VIRT_SCREEN_Y_SIZE) - 1 if onoff else 0] * Settings.VIRT_SCREEN_X_SIZE
+
+    def _cmd_virt_show(self, x, y, roll):
+        size_x = Settings.VIRT_SCREEN_X_SIZE
+        size_y = Settings.VIRT_SCREEN_Y_SIZE
+        for i in range(Settings.MATRIX_X_SIZE):
+            if roll:
+                column = self.virt_screen[(x + i) % size_x]
+                column = (column >> (y % size_y)) | (column << (size_y - y % size_y))
+            else:
+                column = self.virt_screen[x + i] >> y if x + i < size_x else 0
+            self.matrix[i] = column & 0xFF
+
+    def _cmd_exp_fn_set(self, pin, function):
+        if pin not in self.exp_functions:
+            return ERROR_WRONG_PARAM
+        self.exp_functions[pin] = function
+
+    def _cmd_exp_pwr_set(self, onoff):
+        self.exp_power = onoff
+
+    def _cmd_exp_pwr_status(self):
+        return [0xD, self.exp_power]
+
+    def _cmd_exp_io_in_get(self, pin):
+        if self.exp_functions[pin] in (Uart.ExpFunction.OUT, Uart.ExpFunction.OUT_OD):
+            return ['D', self.exp_outputs[pin]]
+        return ['D', self.exp_inputs[pin]]
+
+    def _cmd_exp_io_out_set(self, pin, state):
+        if self.exp_functions[pin] not in (Uart.ExpFunction.OUT, Uart.ExpFunction.OUT_OD):
+            return ERROR_WRONG_PARAM
+        self.exp_outputs[pin] = state
+
+    def _cmd_exp_adc_get(self, pin):
+        if self.exp_functions[pin] in (Uart.ExpFunction.DAC, Uart.ExpFunction.DAC2):
+            return ['D', self.exp_dac[pin]]
+        return ['D', self.exp_adc[pin]]
+
+    def _cmd_exp_dac_set(self, pin, value):
+        if self.exp_functions[pin] not in (Uart.ExpFunction.DAC, Uart.ExpFunction.DAC2):
+            return ERROR_WRONG_PARAM
+        self.exp_dac[pin] = min(value, EMU_DAC_MAX)
+
+
+if __name__ == "__main__":
+    with Emulator() as emulator:
+        print("Pad emulator is working on port:", emulator.device)
+        print("Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -1,23 +1,136 @@
 import math
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from timeit import default_timer as timer
 
+import numpy as np
 import pygame
 from pgzero.builtins import Actor
 from libraries.EduSense import General
 from libraries.EduSense import Uart
 
-
+TEXT_CACHE_SIZE = 128  # how many rendered texts are kept, the least recently used are forgotten
+DASHBOARD_CYCLE_TIME = 0.05  # [s] how often Dashboard exchanges data with pad
+DASHBOARD_FORGET_TIME = 1.0  # [s] pin which wasn't asked for so long, isn't read anymore
+DASHBOARD_RATE_SMOOTHING = 0.1  # how fast measured sampling rate follows changes (0..1)
+DASHBOARD_READ_CMDS = ("EXP_ADC_GET", "EXP_IO_IN_GET")  # commands which give values, the others only set them
+
+
+# looking for system font takes a lot of time, so every font is found only once
+@lru_cache(maxsize=None)
+def font_get(name, size):
+    return pygame.font.SysFont(name, size)
+
+
+# text rendered into surface. Surfaces are cached by (text, size, color, font), so i.e. titles are rendered once
+# and readout of voltmeter only when shown value changes. Don't draw on returned surface, it's shared.
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def text_render(text, size, color, font_name='default'):
+    return font_get(font_name, size).render(text, 1, color)
+
+
+SCOPE_BACKGROUND = (0, 30, 0)
+SCOPE_GRID_COLOR = (0, 80, 0)
+SCOPE_TRACE_COLOR = (80, 255, 80)
+NEEDLE_STEPS = 180  # pointer of voltmeter is drawn in one of so many positions (one per degree)
+_needle_sprites = {}  # (internal radius, external radius) -> [(surface, offset from center)]
+
+
+# pointer of voltmeter in every position, drawn once and shared by all voltmeters
+def needle_sprites_get(int_radius, ext_radius):
+    key = (int_radius, ext_radius)
+    if key not in _needle_sprites:
+        center = ext_radius + 2
+        sprites = []
+        for step in range(NEEDLE_STEPS + 1):
+            surface = pygame.Surface((2 * center, 2 * center), pygame.SRCALPHA)
+            angle = step / NEEDLE_STEPS * math.pi - math.pi
+            x2 = ext_radius * math.cos(angle) + center
+            y2 = ext_radius * math.sin(angle) + center
+            # drawing few lines to get thicker pointer
+            for i in range(-3, 4):
+                x1 = int_radius * math.cos(angle + i / 30) + center
+                y1 = int_radius * math.sin(angle + i / 30) + center
+                pygame.draw.line(surface, (255, 0, 0), (x1, y1), (x2, y2))
+            rect = surface.get_bounding_rect()
+            sprite = surface.subsurface(rect).copy()
+            if pygame.display.get_surface() is not None:
+                sprite = sprite.convert_alpha()
+            sprites.append((sprite, (rect.x - center, rect.y - center)))
+        _needle_sprites[key] = sprites
+    return _needle_sprites[key]
 
 
 def write_title(screen, title, picture, pos_x, pos_y):
-    font = pygame.font.SysFont('default', 30)
-    label = font.render(title, 1, (255, 255, 255))
+    label = text_render(title, 30, (255, 255, 255))
     x = pos_x + (picture.width - label.get_width()) / 2
     y = pos_y + picture.height
     screen.blit(label, (x, y))
 
 
+# area taken by picture and its title (as written by write_title), for Dashboard.draw_dirty
+def title_rect_get(title, picture, pos_x, pos_y):
+    rect = pygame.Rect(pos_x, pos_y, picture.width, picture.height)
+    if title:
+        label = text_render(title, 30, (255, 255, 255))
+        x = pos_x + (picture.width - label.get_width()) / 2
+        rect.union_ip(pygame.Rect(int(x), pos_y + picture.height, label.get_width() + 1, label.get_height()))
+    return rect
+
+
+# Dashboard has no value of pin until its first cycle with it is done - it isn't error yet
+def _read_error_print(widget):
+    if isinstance(widget._port, Dashboard) and not widget._port.is_published(widget):
+        return
+    print("Can't read pin.")
+
+
+# Dashboard joins writings by itself, so widgets connected to it may give every change at once
+def _write_time_get(widget):
+    if isinstance(widget._port, Dashboard):
+        return 0
+    return widget.time_between_readings
+
+
+# The newest value for one output of expander, waiting to be written. Values which come faster than link can take
+# aren't lost: only the newest one is kept and it's written later, by <flush> (widgets run it in update).
+# The same value isn't written twice.
+class OutputWriter:
+    def __init__(self, send):
+        self._send = send  # function(value), which writes value and returns True if it was done
+        self._pending = None
+        self._written = None
+        self._last_write_tick = 0
+
+    def set(self, value, time_between_writings):
+        self._pending = value
+        self.flush(time_between_writings)
+
+    def flush(self, time_between_writings):
+        if self._pending is None:
+            return
+        if self._pending == self._written:
+            self._pending = None
+            return
+        if timer() - self._last_write_tick < time_between_writings:
+            return
+        self._last_write_tick = timer()
+        if self._send(self._pending):
+            self._written = self._pending
+            self._pending = None
+
+    def is_pending(self):
+        return self._pending is not None
+
+    # forget what was written, i.e. after change of pin
+    def reset(self):
+        self._written = None
+
+
 class Voltmeter:
+    _IO_CMD = "EXP_ADC_GET"  # command used by Dashboard for this widget
+
     def __init__(self, screen, *port):
         self._screen = screen
         self._INT_RADIUS = 12
@@ -42,6 +155,7 @@ class Voltmeter:
         self._last_read_tick = 0
 
         self._actor = Actor('voltmeter', anchor=('left', 'top'))
+        self._needle_sprites = needle_sprites_get(self._INT_RADIUS, self._EXT_RADIUS)
         self._topleft_set((0, 0))
 
     def _topleft_set(self, position):
@@ -74,6 +188,8 @@ class Voltmeter:
         # else:
         #     print("Port isn't ready. Can't set pin.")
 
+    # with Dashboard as port, this only takes value published by it. With Uart, pin is read here (blocking draw
+    # or update, until pad answers)
     @property
     def voltage(self):
         if self._port and self._pin_number:
@@ -84,7 +200,7 @@ class Voltmeter:
                     if status:
                         self.voltage = result[0] / 1000  # because we get value in [mV]
                     else:
-                        print("Can't read pin.")
+                        _read_error_print(self)
                 else:
                     print("Port isn't ready. Therefore I can't get voltage from pin.")
             else:
@@ -108,6 +224,15 @@ class Voltmeter:
     def update(self):
         _ = self.voltage
 
+    # what is seen on screen; widget is drawn again by Dashboard.draw_dirty only when it changes
+    def view_get(self):
+        return self.topleft, self.title, round(self.ratio * NEEDLE_STEPS), "{:1.3f}V".format(self._voltage)
+
+    def rect_get(self):
+        label = text_render("{:1.3f}V".format(self._voltage), 64, (255, 0, 0))
+        rect = title_rect_get(self.title, self._actor, self._x, self._y)
+        return rect.union(label.get_rect(topleft=(self._TEXT_X_OFFSET + self._x, self._TEXT_Y_OFFSET + self._y)))
+
     def mouse_get_pos(self, pos):
         pass
 
@@ -118,18 +243,9 @@ class Voltmeter:
         # drawing picture of voltmeter
         self._actor.draw()
 
-        # drawing pointer
-        center_x = self._CENTER_X + self._x
-        center_y = self._CENTER_Y + self._y
-        angle = self._voltage / self._VOLTAGE_AT_RATIO_1 * math.pi - math.pi
-        x2 = self._EXT_RADIUS * math.cos(angle) + center_x
-        y2 = self._EXT_RADIUS * math.sin(angle) + center_y
-        # drawing few lines to get thicker pointer
-        for i in range(-3, 4):
-            x1 = self._INT_RADIUS * math.cos(angle + i / 30) + center_x
-            y1 = self._INT_RADIUS * math.sin(angle + i / 30) + center_y
-            # screen.draw.line((x1, y1), (x2, y2), (255, 0, 0))
-            pygame.draw.line(self._screen, (255, 0, 0), (x1, y1), (x2, y2))
+        # drawing pointer (prepared earlier for every position)
+        sprite, (offset_x, offset_y) = self._needle_sprites[round(self.ratio * NEEDLE_STEPS)]
+        self._screen.blit(sprite, (self._CENTER_X + self._x + offset_x, self._CENTER_Y + self._y + offset_y))
 
         # writting digital representation of voltage
         text_x_offset = self._TEXT_X_OFFSET + self._x
@@ -137,14 +253,15 @@ class Voltmeter:
 
         # screen.draw.text("{:1.3f}V".format(self._voltage), (text_x_offset, text_y_offset),
         #                  fontsize=64, color="red", anchor=(0, 0))
-        font = pygame.font.SysFont('default', 64)
-        label = font.render("{:1.3f}V".format(self._voltage), 1, (255, 0, 0))
+        label = text_render("{:1.3f}V".format(self._voltage), 64, (255, 0, 0))
         self._screen.blit(label, (text_x_offset, text_y_offset))
         # write title of this picture
         write_title(self._screen, self.title, self._actor, self._x, self._y)
 
 
 class Potentiometer:
+    _IO_CMD = "EXP_DAC_SET"
+
     def __init__(self, screen, *port):
         self._screen = screen
         self._SLIDER_X_0 = 19
@@ -161,9 +278,9 @@ class Potentiometer:
         self._y = 0
         self.title = ""
         self._ratio = 0
-        self._last_read_tick  = 0
         self.time_between_readings = 0.1
         self._mouse_pos = (0, 0)
+        self._writer = OutputWriter(self.__dac_write)
 
         self._actor_potentiometer = Actor('potentiometer', anchor=('left', 'top'))
         self._actor_slider = Actor('potentiometer-slider', anchor=('left', 'top'))
@@ -193,26 +310,27 @@ class Potentiometer:
             status = self._port.cmd_exp_fn_set(value, Uart.ExpFunction.DAC)
             if status:
                 self._pin_number = value
+                self._writer.reset()
             else:
                 print("Error occure during pin setting.")
         else:
             print("Port isn't ready. Can't set pin.")
 
+    # the newest voltage is always written, but not more often than time_between_readings
     def __set_val_at_exp_pin(self):
         if self._port and self._pin_number:
-            if timer() - self._last_read_tick > self.time_between_readings:
-                self._last_read_tick = timer()
-                if self._port.is_open():
-                    status = self._port.cmd_exp_dac_set(self._pin_number, int(self._ratio * self._VOLTAGE_AT_RATIO_1 * 1000))
-                    if status:
-                        pass
-                    else:
-                        print("Error occured while setting voltage.")
-                else:
-                    print("Port isn't ready. Therefore I can't set voltage on pin.")
+            self._writer.set(int(self._ratio * self._VOLTAGE_AT_RATIO_1 * 1000), _write_time_get(self))
+
+    def __dac_write(self, value):
+        if self._port.is_open():
+            status = self._port.cmd_exp_dac_set(self._pin_number, value)
+            if status:
+                return True
             else:
-                # print("I can't do changes so fast")
-                pass
+                print("Error occured while setting voltage.")
+        else:
+            print("Port isn't ready. Therefore I can't set voltage on pin.")
+        return False
 
     @property
     def ratio(self):
@@ -233,7 +351,13 @@ class Potentiometer:
     voltage = property(voltage_get, voltage_set)
 
     def update(self):
-        pass
+        self._writer.flush(_write_time_get(self))
+
+    def view_get(self):
+        return self.topleft, self.title, self._ratio
+
+    def rect_get(self):
+        return title_rect_get(self.title, self._actor_potentiometer, self._x, self._y)
 
     def mouse_get_pos(self, pos):
         self._mouse_pos = pos
@@ -260,6 +384,8 @@ class Potentiometer:
 
 
 class DigitalOutput:
+    _IO_CMD = "EXP_IO_OUT_SET"
+
     def __init__(self, screen, *port):
         self._screen = screen
         self._PIC_SWITCH_ON = "switch-on.png"
@@ -272,9 +398,9 @@ class DigitalOutput:
         self._x = 0
         self._y = 0
         self.title = ""
-        self._last_read_tick  = 0
         self.time_between_readings = 0.1
         self._mouse_pos = (0, 0)
+        self._writer = OutputWriter(self.__pin_write)
 
         self._state = 0
         self._actor_switch = Actor(self._PIC_SWITCH_OFF, anchor=('left', 'top'))
@@ -305,6 +431,7 @@ class DigitalOutput:
             status = self._port.cmd_exp_fn_set(value, Uart.ExpFunction.OUT)
             if status:
                 self._pin_number = value
+                self._writer.reset()
             else:
                 print("Error occure during pin setting.")
         else:
@@ -314,34 +441,39 @@ class DigitalOutput:
     def state(self):
         return self._state
 
+    # switch shows new state at once, pin gets it as soon as link allows (the newest one, if there were many)
     @state.setter
     def state(self, value):
-        val_candidate = int(General.clamp_value(value, 0, 1))
+        self._state = int(General.clamp_value(value, 0, 1))
 
         if self._port and self._pin_number:
-            if timer() - self._last_read_tick > self.time_between_readings:
-                self._last_read_tick = timer()
-                if self._port.is_open():
-                    status = self._port.cmd_exp_io_out_set(self._pin_number, val_candidate)
-                    if status:
-                        self._state = val_candidate
-                    else:
-                        print("Error occured while setting pin.")
-                else:
-                    print("Port isn't ready. Therefore I can't set pin.")
-            else:
-                # print("I can't do changes so fast.")
-                pass
-        else:
-            self._state = val_candidate
+            self._writer.set(self._state, _write_time_get(self))
 
         if self._state:
             self._actor_switch.image = self._PIC_SWITCH_ON
         else:
             self._actor_switch.image = self._PIC_SWITCH_OFF
 
+    def __pin_write(self, value):
+        if self._port.is_open():
+            status = self._port.cmd_exp_io_out_set(self._pin_number, value)
+            if status:
+                return True
+            else:
+                print("Error occured while setting pin.")
+        else:
+            print("Port isn't ready. Therefore I can't set pin.")
+        return False
+
     def update(self):
-        pass
+        if self._port and self._pin_number:
+            self._writer.flush(_write_time_get(self))
+
+    def view_get(self):
+        return self.topleft, self.title, self._actor_switch.image
+
+    def rect_get(self):
+        return title_rect_get(self.title, self._actor_switch, self._x, self._y)
 
     def mouse_get_pos(self, pos):
         self._mouse_pos = pos
@@ -360,6 +492,8 @@ class DigitalOutput:
 
 
 class DigitalInput:
+    _IO_CMD = "EXP_IO_IN_GET"
+
     def __init__(self, screen, *port):
         self._screen = screen
         self._PIC_LED_ON = "led-on.png"
@@ -408,6 +542,8 @@ class DigitalInput:
         else:
             print("Port isn't ready. Can't set pin.")
 
+    # with Dashboard as port, this only takes value published by it. With Uart, pin is read here (blocking draw
+    # or update, until pad answers)
     @property
     def state(self):
         if self._port and self._pin_number:
@@ -418,7 +554,7 @@ class DigitalInput:
                     if status:
                         self._state = result[0]
                     else:
-                        print("Can't read pin.")
+                        _read_error_print(self)
                 else:
                     print("Port isn't ready. Therefore I can't get state of pin.")
             else:
@@ -442,6 +578,12 @@ class DigitalInput:
     def update(self):
         _ = self.state
 
+    def view_get(self):
+        return self.topleft, self.title, self._actor_led.image
+
+    def rect_get(self):
+        return title_rect_get(self.title, self._actor_led, self._x, self._y)
+
     def mouse_get_pos(self, pos):
         pass
 
@@ -458,6 +600,8 @@ class DigitalInput:
 
 
 class PowerSwitch:
+    _IO_CMD = "EXP_PWR_SET"
+
     def __init__(self, screen, *port):
         self._screen = screen
         self._PIC_SWITCH_ON = "power-switch-on.png"
@@ -469,9 +613,9 @@ class PowerSwitch:
         self._x = 0
         self._y = 0
         self.title = ""
-        self._last_read_tick  = 0
         self.time_between_readings = 0.2
         self._mouse_pos = (0, 0)
+        self._writer = OutputWriter(self.__power_write)
 
         self._state = 0
         self._actor_switch = Actor(self._PIC_SWITCH_OFF, anchor=('left', 'top'))
@@ -495,34 +639,39 @@ class PowerSwitch:
     def state(self):
         return self._state
 
+    # switch shows new state at once, power gets it as soon as link allows (the newest one, if there were many)
     @state.setter
     def state(self, value):
-        val_candidate = int(General.clamp_value(value, 0, 1))
+        self._state = int(General.clamp_value(value, 0, 1))
 
         if self._port:
-            if timer() - self._last_read_tick > self.time_between_readings:
-                self._last_read_tick = timer()
-                if self._port.is_open():
-                    status = self._port.cmd_exp_pwr_set(val_candidate)
-                    if status:
-                        self._state = val_candidate
-                    else:
-                        print("Error occured while setting power.")
-                else:
-                    print("Port isn't ready. Therefore I can't set power pin.")
-            else:
-                # print("I can't do changes so fast.")
-                pass
-        else:
-            self._state = val_candidate
+            self._writer.set(self._state, _write_time_get(self))
 
         if self._state:
             self._actor_switch.image = self._PIC_SWITCH_ON
         else:
             self._actor_switch.image = self._PIC_SWITCH_OFF
 
+    def __power_write(self, value):
+        if self._port.is_open():
+            status = self._port.cmd_exp_pwr_set(value)
+            if status:
+                return True
+            else:
+                print("Error occured while setting power.")
+        else:
+            print("Port isn't ready. Therefore I can't set power pin.")
+        return False
+
     def update(self):
-        pass
+        if self._port:
+            self._writer.flush(_write_time_get(self))
+
+    def view_get(self):
+        return self.topleft, self.title, self._actor_switch.image
+
+    def rect_get(self):
+        return title_rect_get(self.title, self._actor_switch, self._x, self._y)
 
     def mouse_get_pos(self, pos):
         self._mouse_pos = pos
@@ -540,4 +689,384 @@ class PowerSwitch:
         write_title(self._screen, self.title, self._actor_switch, self._x, self._y)
 
 
+# Chart of voltage in time, from samples collected by Acquisition (in its own thread, as fast as link allows):
+#
+#   acquisition = Acquisition.Acquisition(port, 1)
+#   acquisition.start()
+#   scope = Oscilloscope(screen, acquisition)
+#
+# Every column of screen shows minimum and maximum of samples which fall into it, so short peaks aren't lost,
+# even if there are many samples per pixel. Buffer has constant size, so drawing takes limited time.
+class Oscilloscope:
+    _IO_CMD = None  # it doesn't read pad by itself, Acquisition does it
 
+    def __init__(self, screen, acquisition, width=400, height=200):
+        self._screen = screen
+        self._buffer = getattr(acquisition, "buffer", acquisition)  # Acquisition or just SampleBuffer
+        self._GRID_X_QTY = 10
+        self._GRID_Y_QTY = 4
+
+        self.title = ""
+        self.time_window = 5.0  # [s] time shown on the whole width
+        self.voltage_max = 4.0  # [V] voltage at the top edge
+        self.hold = False  # True stops chart, i.e. to look at captured signal
+        self._x = 0
+        self._y = 0
+        self._rect = pygame.Rect(0, 0, width, height)
+        self._surface = pygame.Surface((width, height))
+        self._drawn = None  # (count of samples, time of the right edge) of chart on <_surface>
+        self._end_time = 0
+
+    def _topleft_set(self, position):
+        self._x, self._y = position
+        self._rect.topleft = position
+
+    def _topleft_get(self):
+        return (self._x, self._y)
+
+    topleft = property(_topleft_get, _topleft_set)
+
+    # (x, min, max) for every column of chart which has samples, the oldest column first
+    def columns_get(self):
+        width, height = self._rect.size
+        start_time = self._end_time - self.time_window
+        times, values = self._buffer.get(since=start_time)
+        end = np.searchsorted(times, self._end_time, side="right")  # with <hold>, newer samples aren't shown
+        times, values = times[:end], values[:end]
+        if not len(times):
+            return []
+
+        columns = np.minimum((times - start_time) * (width / self.time_window), width - 1).astype(np.intp)
+        starts = np.flatnonzero(np.diff(columns, prepend=-1))
+        lows = np.minimum.reduceat(values, starts)
+        highs = np.maximum.reduceat(values, starts)
+        # every column reaches the last sample of column before, so trace has no gaps
+        previous = values[np.maximum(starts - 1, 0)]
+        lows = np.minimum(lows, previous)
+        highs = np.maximum(highs, previous)
+
+        scale = (height - 1) / self.voltage_max
+        tops = np.clip(height - 1 - np.round(highs * scale), 0, height - 1).astype(int)
+        bottoms = np.clip(height - 1 - np.round(lows * scale), 0, height - 1).astype(int)
+        return list(zip(columns[starts].tolist(), tops.tolist(), bottoms.tolist()))
+
+    def update(self):
+        if not self.hold:
+            self._end_time = self._buffer.time_get()
+
+    # chart changes only if there are new samples or it moved by at least one pixel
+    def _chart_state_get(self):
+        pixel_time = self.time_window / self._rect.width
+        return self._buffer.count, int(self._end_time / pixel_time), self.time_window, self.voltage_max
+
+    def view_get(self):
+        return self.topleft, self.title, self._chart_state_get()
+
+    def rect_get(self):
+        return title_rect_get(self.title, self._rect, self._x, self._y)
+
+    def mouse_get_pos(self, pos):
+        pass
+
+    def mouse_get_click(self):
+        pass
+
+    def draw(self):
+        state = self._chart_state_get()
+        if state != self._drawn:
+            self._drawn = state
+            self.__chart_draw()
+        self._screen.blit(self._surface, self._rect.topleft)
+        write_title(self._screen, self.title, self._rect, self._x, self._y)
+
+    def __chart_draw(self):
+        width, height = self._rect.size
+        self._surface.fill(SCOPE_BACKGROUND)
+        for i in range(1, self._GRID_X_QTY):
+            x = i * width // self._GRID_X_QTY
+            pygame.draw.line(self._surface, SCOPE_GRID_COLOR, (x, 0), (x, height - 1))
+        for i in range(1, self._GRID_Y_QTY):
+            y = i * height // self._GRID_Y_QTY
+            pygame.draw.line(self._surface, SCOPE_GRID_COLOR, (0, y), (width - 1, y))
+        for x, top, bottom in self.columns_get():
+            pygame.draw.line(self._surface, SCOPE_TRACE_COLOR, (x, top), (x, bottom))
+
+
+# overlapping rects joined, so every part of screen is drawn only once
+def _rects_merge(rects):
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        i = rect.collidelist(merged)
+        while i >= 0:
+            rect.union_ip(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+# Dashboard talks with pad for all widgets. Give it to widgets instead of port, and add widgets to it:
+#
+#   dashboard = Dashboard(port)
+#   voltmeter = Voltmeter(screen, dashboard)
+#   dashboard.add(voltmeter)
+#
+# and run dashboard.update() and dashboard.draw() in game loop. Dashboard has the same commands as Uart, but they
+# don't go to pad at once. Once per <cycle_time>, all of them are sent together: every pin is read only once, even
+# if many widgets show it, and only the newest value set for every pin is written.
+#
+# After dashboard.start(), exchange with pad is done by separate thread and widgets only read values published
+# by it, so slow or missing answers of pad don't stop drawing. Don't use port by other code in the meantime,
+# unless it is in pipeline mode (Uart.pipeline_start).
+#
+# Instead of dashboard.draw(), which draws all widgets, dashboard.draw_dirty(screen) draws only widgets which look
+# different than before (and whatever they overlap) and updates only these parts of display. Use it when screen
+# isn't cleared before every frame - when nothing changes, nothing is drawn.
+class Dashboard:
+    def __init__(self, port, cycle_time=DASHBOARD_CYCLE_TIME):
+        self._port = port
+        self.cycle_time = cycle_time
+        self.widgets = []
+        self._lock = threading.Lock()  # guards _reads and _writes, which are filled by widgets
+        self._reads = {}  # (command, pin) -> time when some widget asked for it last time
+        self._writes = OrderedDict()  # (command, pin) -> parameters, only the newest for every pin
+        # (command, pin) -> (results of reading, time of the last success, average time between successes),
+        # all None if pin was tried, but without success yet.
+        # Made by every cycle as new dict, so readers always see complete state without locking
+        self._snapshot = {}
+        self._next_cycle = 0
+        self.cycles = 0
+
+        self._worker = None
+        self._running = False
+        self._wake = threading.Event()
+
+        self._drawn = {}  # widget -> (rect, view) as it was drawn last time, for draw_dirty
+
+    def add(self, *widgets):
+        self.widgets.extend(widgets)
+        # pins shown by widgets will be read in the next cycle, without waiting until widget asks for them
+        for widget in widgets:
+            key = self.__key_get(widget)
+            if key[0] in DASHBOARD_READ_CMDS and key[1] is not None:
+                with self._lock:
+                    self._reads[key] = timer()
+
+    def is_open(self):
+        return self._port.is_open()
+
+    # exchange data with pad in separate thread. The first cycle is done at once, so widgets have values from start
+    def start(self):
+        if self._worker is not None:
+            return
+        self.cycle()
+        self._running = True
+        self._worker = threading.Thread(target=self.__work, name="Dashboard", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        if self._worker is None:
+            return
+        self._running = False
+        self._wake.set()
+        self._worker.join()
+        self._worker = None
+
+    # reads are done once per <cycle_time>, but new writings are sent as soon as the previous exchange is done,
+    # so outputs follow widgets as fast as link allows
+    def __work(self):
+        while self._running:
+            if timer() >= self._next_cycle:
+                self.cycle()
+            else:
+                self.__writes_flush()
+            self._wake.wait(max(0, self._next_cycle - timer()))
+            self._wake.clear()
+
+    # below are commands used by widgets
+
+    def cmd_exp_fn_set(self, pin, function):
+        return self.__write("EXP_FN_SET", pin, [pin, function])
+
+    def cmd_exp_pwr_set(self, onoff):
+        return self.__write("EXP_PWR_SET", None, [int(onoff != 0)])
+
+    def cmd_exp_io_out_set(self, pin, state):
+        return self.__write("EXP_IO_OUT_SET", pin, [pin, int(state != 0)])
+
+    def cmd_exp_dac_set(self, pin, value):
+        return self.__write("EXP_DAC_SET", pin, [pin, value])
+
+    def cmd_exp_adc_get(self, pin):
+        return self.__read("EXP_ADC_GET", pin)
+
+    def cmd_exp_io_in_get(self, pin):
+        return self.__read("EXP_IO_IN_GET", pin)
+
+    def __write(self, cmd_name, pin, params):
+        if pin is not None and not Uart.exp_pin_check(pin):
+            return False
+        with self._lock:
+            self._writes[(cmd_name, pin)] = params
+            self._writes.move_to_end((cmd_name, pin))  # the newest writing goes after the ones which came before it
+        if self._worker is not None:
+            self._wake.set()
+        return True
+
+    # the newest value read from pad. Pin which is asked for the first time is read at once
+    # (by worker thread, if it is running)
+    def __read(self, cmd_name, pin):
+        if not Uart.exp_pin_check(pin):
+            return False, []
+        key = (cmd_name, pin)
+        with self._lock:
+            self._reads[key] = timer()
+        if key not in self._snapshot:
+            if self._worker is not None:
+                self._wake.set()
+            elif self._port.is_open():
+                self.__exchange([], [key])
+        value = self._snapshot.get(key)
+        if value is None or value[0] is None:
+            return False, []
+        return True, list(value[0])
+
+    # True, if pin of widget was already read (or tried to be read) by some cycle
+    def is_published(self, widget):
+        return self.__key_get(widget) in self._snapshot
+
+    # how old (in seconds) is value of widget, None if there wasn't any successful reading (or writing) yet
+    def staleness_get(self, widget):
+        value = self._snapshot.get(self.__key_get(widget))
+        if value is None or value[1] is None:
+            return None
+        return timer() - value[1]
+
+    # how many times per second value of widget is really read from pad (or written)
+    def rate_get(self, widget):
+        value = self._snapshot.get(self.__key_get(widget))
+        if value is None or not value[2]:
+            return 0
+        return 1 / value[2]
+
+    def __key_get(self, widget):
+        return widget._IO_CMD, getattr(widget, "pin_number", None)
+
+    def update(self):
+        for widget in self.widgets:
+            widget.update()
+        if self._worker is None and timer() >= self._next_cycle:
+            self.cycle()
+
+    # exchange data with pad now
+    def cycle(self):
+        time_now = timer()
+        self._next_cycle = time_now + self.cycle_time
+        if not self._port.is_open():
+            return
+        self.cycles += 1
+
+        with self._lock:
+            for key in [x for x, time in self._reads.items() if time_now - time > DASHBOARD_FORGET_TIME]:
+                del self._reads[key]
+            reads = list(self._reads)
+            writes, self._writes = list(self._writes.items()), OrderedDict()
+        self.__exchange(writes, reads)
+
+    def __writes_flush(self):
+        if not self._port.is_open():
+            return
+        with self._lock:
+            writes, self._writes = list(self._writes.items()), OrderedDict()
+        if writes:
+            self.__exchange(writes, [])
+
+    # writings first (in order they came), readings after them. With port in pipeline mode (Uart.pipeline_start),
+    # all frames are sent at once, without waiting for previous answers
+    def __exchange(self, writes, reads):
+        requests = [(key[0], params) for key, params in writes] + [(key[0], [key[1]]) for key in reads]
+        writes_params = dict(writes)
+        if getattr(self._port, "is_pipelined", lambda: False)():
+            futures = [self._port.send_async(cmd_name, params) for cmd_name, params in requests]
+            answers = [x.result() for x in futures]
+        else:
+            answers = [self._port.send(cmd_name, params) for cmd_name, params in requests]
+
+        time_now = timer()
+        snapshot = dict(self._snapshot)
+        retries = []
+        for key, (is_ok, results) in zip([x[0] for x in writes] + reads, answers):
+            if not is_ok and key in writes_params:
+                retries.append(key)
+            if not is_ok or Uart.rx_error_get(results) != 0:
+                print("Error: command {} failed: {}".format(key[0], results))
+                # pin was tried, so it isn't read again at once by widget, but in normal cycle
+                snapshot.setdefault(key, (None, None, None))
+                continue
+            values, time, interval = snapshot.get(key, (None, None, None))
+            if key[0] in DASHBOARD_READ_CMDS:
+                values = tuple(results[1:])  # without 'D'
+            if time is not None:
+                interval = time_now - time if interval is None else \
+                    interval + (time_now - time - interval) * DASHBOARD_RATE_SMOOTHING
+            snapshot[key] = (values, time_now, interval)
+        self._snapshot = snapshot  # readers see old or new state, never half of it
+
+        # writings without answer are repeated (before new ones), unless newer value came in the meantime
+        with self._lock:
+            for key in reversed(retries):
+                if key not in self._writes:
+                    self._writes[key] = writes_params[key]
+                    self._writes.move_to_end(key, last=False)
+
+    def draw(self):
+        for widget in self.widgets:
+            widget.draw()
+            self._drawn[widget] = (widget.rect_get(), widget.view_get())
+
+    # forget what was drawn, so the next draw_dirty will draw everything (i.e. after screen was cleared)
+    def invalidate(self):
+        self._drawn = {}
+
+    # draw widgets, which changed since they were drawn last time. Their old and new areas are filled with
+    # <background> (colour or Surface as big as screen) and all widgets, which are there, are drawn again (only
+    # inside these areas). Returns list of changed rects, which are also updated on display, if <display_update>
+    def draw_dirty(self, screen, background=(0, 0, 0), display_update=True):
+        dirty = []
+        for widget in self.widgets:
+            current = (widget.rect_get(), widget.view_get())
+            drawn = self._drawn.get(widget)
+            if drawn != current:
+                if drawn is not None:
+                    dirty.append(drawn[0])
+                dirty.append(current[0])
+                self._drawn[widget] = current
+        for widget in [x for x in self._drawn if x not in self.widgets]:  # removed widgets
+            dirty.append(self._drawn.pop(widget)[0])
+        if not dirty:
+            return []
+
+        surface = getattr(screen, "surface", screen)  # pgzero screen or pygame Surface
+        rects = _rects_merge(dirty)
+        clip = surface.get_clip()
+        for rect in rects:
+            surface.set_clip(rect)
+            if isinstance(background, pygame.Surface):
+                surface.blit(background, rect, rect)
+            else:
+                surface.fill(background, rect)
+            for widget in self.widgets:
+                if self._drawn[widget][0].colliderect(rect):
+                    widget.draw()
+        surface.set_clip(clip)
+        if display_update:
+            pygame.display.update(rects)
+        return rects
+
+    def mouse_get_pos(self, pos):
+        for widget in self.widgets:
+            widget.mouse_get_pos(pos)
+
+    def mouse_get_click(self):
+        for widget in self.widgets:
+            widget.mouse_get_click()
@@ -1,11 +1,14 @@
+import hashlib
+import mmap
+import os
+import struct
+from functools import lru_cache
 
 
-
+# 8 rows of char (bit 0 is the left pixel) from font, which is in use right now
 def to_pixels(one_char):
-    if one_char in font8x8:
-        return font8x8[one_char]
-    else :
-        return font8x8[" "]
+    code = _code_get(one_char)
+    return list(font_rows[code * 8: code * 8 + 8])
 
 
 font8x8 = \
@@ -107,3 +110,311 @@ font8x8 = \
         "~": [0x0, 0x0, 0x0, 0x6, 0x49, 0x30, 0x0, 0x0]
     }
 
+
+
+# Below, fonts are compiled into tables indexed by code point. For every char there are 8 bytes:
+#   font_rows     - row by row, bit 0 is the left pixel (the same as font8x8)
+#   font_columns  - column by column, bit 0 is the top pixel (the same as LED_MATRIX and VIRT_WRITE commands)
+# font_lefts and font_widths say which columns of char are used, for proportional text.
+# Tables cover ASCII, Latin-1 and Latin Extended-A (Polish letters), chars which are not in font are blank.
+FONT_CODE_MAX = 0x180
+FONT_SPACE_WIDTH = 3  # width of blank char in proportional text
+FONT_CACHE_MAGIC = b"EDUFONT1"
+FONT_CACHE_DIR = "__fontcache__"  # made next to font file, like __pycache__
+
+# Polish letters made from letters of font8x8 and accents: {row: pixels added to row}
+_ACUTE = {0: 0x10, 1: 0x8}
+font8x8_accents = \
+    {
+        "ą": ("a", {7: 0x40}),
+        "ć": ("c", _ACUTE),
+        "ę": ("e", {7: 0x20}),
+        "ł": ("l", {3: 0x10, 5: 0x4}),
+        "ń": ("n", _ACUTE),
+        "ó": ("o", _ACUTE),
+        "ś": ("s", _ACUTE),
+        "ź": ("z", _ACUTE),
+        "ż": ("z", {0: 0x18}),
+        "Ą": ("A", {7: 0x40}),
+        "Ę": ("E", {7: 0x40}),
+        "Ł": ("L", {3: 0x8, 5: 0x2}),
+    }
+
+
+def _builtin_glyphs():
+    glyphs = {ord(one_char): rows for one_char, rows in font8x8.items()}
+    for one_char, (base, accent) in font8x8_accents.items():
+        glyphs[ord(one_char)] = [row | accent.get(y, 0) for y, row in enumerate(font8x8[base])]
+    return glyphs
+
+
+def _rows_to_columns(rows):
+    columns = [0] * 8
+    for y, row in enumerate(rows):
+        for x in range(8):
+            if row & (1 << x):
+                columns[x] |= 1 << y
+    return columns
+
+
+# glyphs: {code point: 8 rows}
+def _compile(glyphs):
+    rows_table = bytearray(8 * FONT_CODE_MAX)
+    columns_table = bytearray(8 * FONT_CODE_MAX)
+    lefts = bytearray(FONT_CODE_MAX)
+    widths = bytearray([FONT_SPACE_WIDTH]) * FONT_CODE_MAX
+    for code, rows in glyphs.items():
+        if code >= FONT_CODE_MAX:
+            continue
+        columns = _rows_to_columns(rows)
+        rows_table[code * 8: code * 8 + 8] = bytes(rows)
+        columns_table[code * 8: code * 8 + 8] = bytes(columns)
+        used = [x for x in range(8) if columns[x]]
+        if used:
+            lefts[code] = used[0]
+            widths[code] = used[-1] - used[0] + 1
+    return bytes(rows_table), bytes(columns_table), bytes(lefts), bytes(widths)
+
+
+font_rows, font_columns, font_lefts, font_widths = _compile(_builtin_glyphs())
+_font_builtin = (font_rows, font_columns, font_lefts, font_widths)
+_font_map = None  # memory mapped cache file of loaded font
+
+
+def _code_get(one_char):
+    code = ord(one_char)
+    return code if code < FONT_CODE_MAX else ord(" ")
+
+
+# 8 bytes of char, column by column
+def to_columns(one_char):
+    code = _code_get(one_char)
+    return bytes(font_columns[code * 8: code * 8 + 8])
+
+
+# whole text rendered into columns (one byte per column, bit 0 is the top pixel), ready to be sent to LED matrix.
+# Texts are cached, so i.e. scrolling of long message takes only next slice of the same bytes.
+@lru_cache(maxsize=128)
+def text_to_columns(text, proportional=False, spacing=1):
+    if not proportional:
+        return b"".join(to_columns(x) for x in text)
+
+    columns = bytearray()
+    for one_char in text:
+        code = _code_get(one_char)
+        start = code * 8 + font_lefts[code]
+        columns += font_columns[start: start + font_widths[code]]
+        columns += bytes(spacing)
+    return bytes(columns)
+
+
+# Loading of external bitmap fonts (BDF or PSF, chars up to 8x8 pixels):
+#
+#   Font.load("fonts/polish.bdf")
+#
+# Font is compiled into tables once and stored in cache file (in __fontcache__ next to font), next runs only map
+# this file into memory. Chars missing in loaded font are taken from font8x8.
+
+# turn row of font file (bit 7 of first byte is the left pixel) into row of font8x8 (bit 0 is the left pixel)
+_BITS_REVERSED = bytes(int("{:08b}".format(x)[::-1], 2) for x in range(256))
+
+
+def _row_get(row_bytes, x):
+    # only the first byte is used, font is not wider than 8 pixels
+    row = _BITS_REVERSED[row_bytes[0]] if row_bytes else 0
+    return (row << x) & 0xFF if x >= 0 else row >> -x
+
+
+def _size_check(width, height):
+    if width > 8 or height > 8:
+        raise ValueError("it is {}x{}, only fonts up to 8x8 can be used".format(width, height))
+
+
+def _bdf_parse(path):
+    glyphs = {}
+    ascent = None
+    bbox = (8, 8, 0, 0)
+    with open(path, encoding="latin-1") as file:
+        lines = iter(file.read().splitlines())
+
+    for line in lines:
+        words = line.split()
+        if not words:
+            continue
+        if words[0] == "FONTBOUNDINGBOX":
+            bbox = tuple(int(x) for x in words[1:5])
+            _size_check(bbox[0], bbox[1])
+        elif words[0] == "FONT_ASCENT":
+            ascent = int(words[1])
+        elif words[0] == "STARTCHAR":
+            code = -1
+            glyph_box = bbox
+            for line in lines:
+                words = line.split()
+                if not words:
+                    continue
+                if words[0] == "ENCODING":
+                    code = int(words[-1])
+                elif words[0] == "BBX":
+                    glyph_box = tuple(int(x) for x in words[1:5])
+                elif words[0] == "BITMAP":
+                    break
+            bitmap = []
+            for line in lines:
+                line = line.strip()
+                if line == "ENDCHAR":
+                    break
+                if line:
+                    bitmap.append(bytes.fromhex(line))
+            if code < 0:
+                continue
+
+            if ascent is None:
+                ascent = bbox[1] + bbox[3]
+            width, height, x_offset, y_offset = glyph_box
+            top = ascent - (y_offset + height)  # row of cell, where bitmap starts
+            rows = [0] * 8
+            for i, row_bytes in enumerate(bitmap[:height]):
+                if 0 <= top + i < 8:
+                    rows[top + i] = _row_get(row_bytes, x_offset - bbox[2])
+            glyphs[code] = rows
+    return glyphs
+
+
+def _psf_parse(path):
+    with open(path, "rb") as file:
+        data = file.read()
+
+    if data[:2] == b"\x36\x04" and len(data) >= 4:
+        mode, height = data[2], data[3]
+        width, row_size, offset = 8, 1, 4
+        glyphs_qty = 512 if mode & 0x01 else 256
+        has_table = mode & 0x06
+    elif data[:4] == b"\x72\xb5\x4a\x86" and len(data) >= 32:
+        _, offset, flags, glyphs_qty, _, height, width = struct.unpack_from("<7I", data, 4)
+        row_size = (width + 7) // 8
+        has_table = flags & 0x01
+    else:
+        raise ValueError("it is not a PSF font")
+    _size_check(width, height)
+
+    char_size = row_size * height
+    if len(data) < offset + glyphs_qty * char_size:
+        raise ValueError("file is too short for {} glyphs".format(glyphs_qty))
+    bitmaps = [data[offset + i * char_size: offset + (i + 1) * char_size] for i in range(glyphs_qty)]
+    rows_list = [[_row_get(x[y * row_size: (y + 1) * row_size], 0) for y in range(height)] + [0] * (8 - height)
+                 for x in bitmaps]
+
+    if not has_table:
+        return dict(enumerate(rows_list))
+
+    # unicode table: code points of every glyph. Sequences of code points (after separator) are skipped
+    glyphs = {}
+    table = data[offset + glyphs_qty * char_size:]
+    if data[:2] == b"\x36\x04":
+        values = struct.unpack("<{}H".format(len(table) // 2), table[:len(table) // 2 * 2])
+        index, is_sequence = 0, False
+        for value in values:
+            if index >= glyphs_qty:
+                break
+            if value == 0xFFFF:
+                index, is_sequence = index + 1, False
+            elif value == 0xFFFE:
+                is_sequence = True
+            elif not is_sequence:
+                glyphs[value] = rows_list[index]
+    else:
+        for index, entry in enumerate(table.split(b"\xff")[:glyphs_qty]):
+            for one_char in entry.split(b"\xfe")[0].decode("utf-8", "replace"):
+                glyphs[ord(one_char)] = rows_list[index]
+    return glyphs
+
+
+def _cache_path_get(path, cache_dir):
+    # name of cache file changes with path, size and time of modification of font, so old cache is never used
+    status = os.stat(path)
+    key = "{}:{}:{}:{}".format(os.path.abspath(path), status.st_size, status.st_mtime_ns, FONT_CODE_MAX)
+    name = os.path.splitext(os.path.basename(path))[0]
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), FONT_CACHE_DIR)
+    return os.path.join(cache_dir, "{}-{}.bin".format(name, hashlib.sha1(key.encode()).hexdigest()[:16]))
+
+
+def _cache_map(cache_path):
+    size = len(FONT_CACHE_MAGIC) + 18 * FONT_CODE_MAX
+    try:
+        with open(cache_path, "rb") as file:
+            font_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(font_map) != size or font_map[:len(FONT_CACHE_MAGIC)] != FONT_CACHE_MAGIC:
+        font_map.close()
+        return None
+    return font_map
+
+
+def _cache_write(cache_path, tables):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        with open(temp_path, "wb") as file:
+            file.write(FONT_CACHE_MAGIC)
+            for table in tables:
+                file.write(table)
+        os.replace(temp_path, cache_path)  # other process never sees half written file
+        return True
+    except OSError:
+        print("Unable to write font cache:", cache_path)
+        return False
+
+
+def _tables_set(tables, font_map=None):
+    # previous map isn't closed here, it is released when the last slice of it is gone
+    global font_rows, font_columns, font_lefts, font_widths, _font_map
+    font_rows, font_columns, font_lefts, font_widths = tables
+    _font_map = font_map
+    text_to_columns.cache_clear()
+
+
+# load BDF (.bdf) or PSF (.psf, .psfu) font and use it instead of font8x8. Returns False if file can't be read.
+def load(path, cache_dir=None):
+    try:
+        cache_path = _cache_path_get(path, cache_dir)
+    except OSError:
+        print("Unable to open font:", path)
+        return False
+
+    font_map = _cache_map(cache_path)
+    if font_map is None:
+        try:
+            if path.lower().endswith(".bdf"):
+                glyphs = _bdf_parse(path)
+            else:
+                glyphs = _psf_parse(path)
+        except OSError:
+            print("Unable to open font:", path)
+            return False
+        except (ValueError, IndexError) as error:  # too big or damaged font
+            print("Unable to use font {}: {}".format(path, error))
+            return False
+        tables = _compile({**_builtin_glyphs(), **glyphs})
+        if _cache_write(cache_path, tables):
+            font_map = _cache_map(cache_path)
+        if font_map is None:
+            _tables_set(tables)
+            return True
+
+    view = memoryview(font_map)
+    start = len(FONT_CACHE_MAGIC)
+    sizes = (8 * FONT_CODE_MAX, 8 * FONT_CODE_MAX, FONT_CODE_MAX, FONT_CODE_MAX)
+    tables = []
+    for size in sizes:
+        tables.append(view[start: start + size])
+        start += size
+    _tables_set(tables, font_map)
+    return True
+
+
+# go back to font8x8
+def builtin_use():
+    _tables_set(_font_builtin)
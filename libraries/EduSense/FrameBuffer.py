@@ -0,0 +1,113 @@
+import numpy as np
+
+from libraries.EduSense import Font
+from libraries.EduSense import Settings
+
+
+def _columns_to_array(columns):
+    # bytes of columns (bit 0 is the top pixel) turned into array [x, y]
+    return np.unpackbits(np.frombuffer(columns, dtype=np.uint8)[:, np.newaxis], axis=1, bitorder="little").astype(bool)
+
+
+# Bitmap of pixels indexed [x, y] (True means LED on), with operations done on whole arrays.
+# It can be bigger than one LED matrix, i.e. for chained matrices or for text scrolled through the matrix.
+class FrameBuffer:
+    def __init__(self, width=Settings.MATRIX_X_SIZE, height=Settings.MATRIX_Y_SIZE):
+        self.pixels = np.zeros((width, height), dtype=bool)
+
+    @property
+    def width(self):
+        return self.pixels.shape[0]
+
+    @property
+    def height(self):
+        return self.pixels.shape[1]
+
+    def copy(self):
+        frame = FrameBuffer(0, 0)
+        frame.pixels = self.pixels.copy()
+        return frame
+
+    def clear(self):
+        self.pixels[:] = False
+
+    def fill(self, value=True):
+        self.pixels[:] = bool(value)
+
+    def invert(self):
+        np.logical_not(self.pixels, out=self.pixels)
+
+    def pixel_set(self, x, y, value=True):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.pixels[x, y] = bool(value)
+
+    def pixel_get(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return bool(self.pixels[x, y])
+        return False
+
+    # put <source> (FrameBuffer or array [x, y]) at position x, y. Whatever is outside of buffer is cut off.
+    # mode: "copy", "or", "and", "xor". Only pixels where <mask> (the same size as source) is True are changed.
+    def blit(self, source, x=0, y=0, mode="copy", mask=None):
+        src = source.pixels if isinstance(source, FrameBuffer) else np.asarray(source, dtype=bool)
+        if mask is not None:
+            mask = mask.pixels if isinstance(mask, FrameBuffer) else np.asarray(mask, dtype=bool)
+
+        # part of source, which will fit into buffer
+        sx0, sy0 = max(0, -x), max(0, -y)
+        sx1 = min(src.shape[0], self.width - x)
+        sy1 = min(src.shape[1], self.height - y)
+        if sx0 >= sx1 or sy0 >= sy1:
+            return
+        src = src[sx0:sx1, sy0:sy1]
+        dst = self.pixels[x + sx0: x + sx1, y + sy0: y + sy1]
+        if mask is not None:
+            mask = mask[sx0:sx1, sy0:sy1]
+
+        if mode == "copy":
+            if mask is None:
+                dst[:] = src
+            else:
+                np.copyto(dst, src, where=mask)
+        elif mode == "or":
+            dst |= src if mask is None else src & mask
+        elif mode == "and":
+            dst &= src if mask is None else src | ~mask
+        elif mode == "xor":
+            dst ^= src if mask is None else src & mask
+        else:
+            raise ValueError("Unknown blit mode: {}".format(mode))
+
+    # masked operations with other buffer (or array) of the same size
+    def or_with(self, other, mask=None):
+        self.blit(other, 0, 0, "or", mask)
+
+    def and_with(self, other, mask=None):
+        self.blit(other, 0, 0, "and", mask)
+
+    # move whole content by dx, dy. With <roll>, what goes out on one side, comes back on the other
+    def shift(self, dx, dy, roll=False):
+        if roll:
+            self.pixels = np.roll(self.pixels, (dx, dy), axis=(0, 1))
+            return
+        moved = np.zeros_like(self.pixels)
+        target = FrameBuffer(0, 0)
+        target.pixels = moved
+        target.blit(self.pixels, dx, dy)
+        self.pixels = moved
+
+    # draw one char from Font.font8x8 (8x8 pixels) with left top corner at x, y
+    def glyph(self, one_char, x=0, y=0, mode="or"):
+        self.blit(_columns_to_array(Font.to_columns(one_char)), x, y, mode)
+
+    # draw text, every char is 8 pixels wide, or (with <proportional>) as wide as it needs
+    def text(self, text, x=0, y=0, mode="or", proportional=False):
+        if text:
+            self.blit(_columns_to_array(Font.text_to_columns(text, proportional)), x, y, mode)
+
+    # pack 8 rows (from y) of <width> columns (from x) into bytes of LED_MATRIX command (bit 0 is the top row).
+    # Pixels outside of buffer are off.
+    def columns_get(self, x=0, y=0, width=Settings.MATRIX_X_SIZE):
+        window = FrameBuffer(width, Settings.MATRIX_Y_SIZE)
+        window.blit(self.pixels, -x, -y)
+        return np.packbits(window.pixels, axis=1, bitorder="little")[:, 0].tolist()
@@ -0,0 +1,121 @@
+from functools import lru_cache
+
+import numpy as np
+import pygame
+
+from libraries.EduSense import General
+from libraries.EduSense import Sound
+
+# Host side sound, for game without pad. Melodies (Tones/Note, the same as for Sound.play_tones) are rendered
+# into PCM and played by pygame mixer. HostSound answers SOUND_PLAY like pad, so it can be used as port:
+#
+#   port = HostSound.HostSound()
+#   Sound.play_tones(port, 0, Sound.MELODY_SAMPLE_INTRO)
+#   sequencer = Sound.SoundSequencer(port)
+
+HOST_SAMPLE_RATE = 22050  # [Hz] used if mixer isn't initialized yet
+HOST_VOLUME = 0.3  # 0..1
+HOST_ATTACK_TIME = 0.004  # [s] envelope of every tone, to avoid clicks
+HOST_RELEASE_TIME = 0.01  # [s]
+
+
+# melody rendered into mono samples (int16). Rendered melodies are cached, result must not be changed
+def melody_render(melody, rate=HOST_SAMPLE_RATE, wave="square", volume=HOST_VOLUME):
+    return _melody_render(tuple(int(x) for x in melody), rate, wave, volume)
+
+
+@lru_cache(maxsize=32)
+def _melody_render(melody, rate, wave, volume):
+    pieces = []
+    end = 0
+    time = 0  # [0,01s]
+    for tone, duration in zip(melody[0::2], melody[1::2]):
+        # end of every tone is rounded (not its length), so rounding errors don't add up
+        time += duration
+        start, end = end, round(time * rate / 100)
+        pieces.append(_tone_render(tone, end - start, rate, wave, volume))
+    result = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int16)
+    result.flags.writeable = False
+    return result
+
+
+# one tone (in 0,01kHz) of <count> samples. Melodies use only few different tones, so each one is rendered once
+@lru_cache(maxsize=256)
+def _tone_render(tone, count, rate, wave, volume):
+    if tone == 0:
+        return np.zeros(count, dtype=np.int16)
+
+    t = np.arange(count, dtype=np.float32)
+    phase = (t * np.float32(tone * 10 / rate)) % 1.0
+    if wave == "square":
+        samples = np.where(phase < 0.5, np.float32(1), np.float32(-1))
+    elif wave == "triangle":
+        samples = 4 * np.abs(phase - 0.5) - 1
+    else:
+        raise ValueError("Unknown wave: {}".format(wave))
+
+    # linear attack and release, to avoid clicks between tones
+    envelope = np.minimum((t + 1) / max(1, HOST_ATTACK_TIME * rate), (count - t) / max(1, HOST_RELEASE_TIME * rate))
+    samples *= np.minimum(envelope, 1) * np.float32(volume * 32767)
+    result = samples.astype(np.int16)
+    result.flags.writeable = False
+    return result
+
+
+class HostSound:
+    def __init__(self, wave="square", volume=HOST_VOLUME):
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(frequency=HOST_SAMPLE_RATE, size=-16, channels=1)
+        self._rate, _, self._channels = pygame.mixer.get_init()
+        self.wave = wave
+        self.volume = volume
+        # channel 0 is kept for melodies, so other sounds of game don't take it
+        pygame.mixer.set_reserved(1)
+        self._channel = pygame.mixer.Channel(0)
+        self._queued = None  # samples of sound waiting in channel queue
+
+    def is_open(self):
+        return True
+
+    # the same answer as Uart.send gives. Only SOUND_PLAY is supported, there is nothing else on host
+    def send(self, cmd_name, *data):
+        if cmd_name != "SOUND_PLAY":
+            return False, []
+        self.__queue(melody_render(General.vars_to_list(*data), self._rate, self.wave, self.volume))
+        return True, []
+
+    def cmd_sound_play(self, *data):
+        is_ok, *_ = self.send("SOUND_PLAY", *data)
+        return is_ok
+
+    # play whole melody, the same as Sound.play_tones does on pad
+    def play(self, melody, pause=0):
+        for data_set, _ in Sound.melody_compile(melody, pause):
+            self.send("SOUND_PLAY", list(data_set))
+
+    def stop(self):
+        self._channel.stop()
+        self._queued = None
+
+    def is_playing(self):
+        return self._channel.get_busy()
+
+    # pad plays tones one after another, here channel plays one sound and has place for one more in queue.
+    # If next sound comes before queued one started, they are joined
+    def __queue(self, samples):
+        if not len(samples):
+            return
+        if not self._channel.get_busy():
+            self._queued = None
+            self._channel.play(self.__sound_make(samples))
+        elif self._channel.get_queue() is None or self._queued is None:
+            self._queued = samples
+            self._channel.queue(self.__sound_make(samples))
+        else:
+            self._queued = np.concatenate((self._queued, samples))
+            self._channel.queue(self.__sound_make(self._queued))
+
+    def __sound_make(self, samples):
+        if self._channels > 1:
+            samples = np.repeat(samples[:, np.newaxis], self._channels, axis=1)
+        return pygame.sndarray.make_sound(np.ascontiguousarray(samples))
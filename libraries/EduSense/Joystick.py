@@ -1,6 +1,7 @@
 
 import pygame
 from enum import IntEnum
+from timeit import default_timer as timer
 from libraries.EduSense import Settings
 
 
@@ -23,12 +24,58 @@ class  PadAxis(IntEnum):
     Y = 1
 
 
+PAD_BUTTONS = (PadKey.UP, PadKey.DOWN, PadKey.LEFT, PadKey.RIGHT, PadKey.OK, PadKey.JOY)
+PAD_AXES = (PadAxis.X, PadAxis.Y)
+# connecting and disconnecting of joysticks (SDL2 only)
+JOYSTICK_DEVICE_EVENTS = (getattr(pygame, "JOYDEVICEADDED", -1), getattr(pygame, "JOYDEVICEREMOVED", -1))
+JOYSTICK_EVENTS = (pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP, pygame.JOYAXISMOTION) + JOYSTICK_DEVICE_EVENTS
+
+
+# State of pad in one frame, made by Joystick.update from events. Read it as many times as you need,
+# there are no SDL calls behind it.
+#   buttons   - state of buttons in order: UP, DOWN, LEFT, RIGHT, OK, JOY (the same as Joystick.buttons_get)
+#   axes      - X, Y (the same as Joystick.axes_get)
+#   pressed   - buttons (PadKey) which went down since previous update, released - which went up
+#   events    - [(time, type, button or axis, value)] since previous update, in order they came
+#   button_times, axis_times - {button or axis: time of its last change}
+#   time      - time of update. Times are from timeit.default_timer, taken when events were taken from pygame queue.
+#               Pygame events don't carry time when they came, so all events of one update have the same time
+#               (it tells in which update change was seen, not how long it waited in queue)
+class JoystickState:
+    def __init__(self, buttons, axes, pressed, released, events, button_times, axis_times, time):
+        self.buttons = buttons
+        self.axes = axes
+        self.pressed = pressed
+        self.released = released
+        self.events = events
+        self.button_times = button_times
+        self.axis_times = axis_times
+        self.time = time
+
+    def button_get(self, button_name):
+        if button_name not in PAD_BUTTONS:
+            return False
+        return int(button_name in self.pressed or self.buttons[PAD_BUTTONS.index(button_name)])
+
+    def is_pressed(self, button_name):
+        return button_name in self.pressed
+
+    def is_released(self, button_name):
+        return button_name in self.released
+
+
 class Joystick:
     def __init__(self):
         self._buttons_qty = None
         self._axes_qty = None
         self._guid = None
         self._name = None
+        self._joy_id = None
+        self._state_buttons = []  # state of all buttons of joystick, kept by update
+        self._state_axes = []
+        self._button_times = {}
+        self._axis_times = {}
+        self._state = JoystickState([0] * len(PAD_BUTTONS), [0, 0], frozenset(), frozenset(), [], {}, {}, timer())
         pygame.joystick.init()
 
     def open(self):
@@ -36,37 +83,48 @@ class Joystick:
         joystick_count = pygame.joystick.get_count()
 
         for i in range(joystick_count):
-            self._joystick = pygame.joystick.Joystick(i)
-            self._joystick.init()
-
+            if self.__joystick_open(i):
+                return True
+        self._name = ''
+        return False
+
+    # open joystick number <index> and check if it is our pad
+    def __joystick_open(self, index):
+        self._joystick = pygame.joystick.Joystick(index)
+        self._joystick.init()
+
+        try:
+            self._joy_id = self._joystick.get_instance_id()
+        except AttributeError:
+            # get_instance_id() is an SDL2 method
+            self._joy_id = self._joystick.get_id()
+
+        # Get the name from the OS for the controller/joystick.
+        self._name = self._joystick.get_name()
+        if Settings.USB_NAME in self._name:
+            print("Gamepad found")
             try:
-                self._joy_id = self._joystick.get_instance_id()
+                self._guid = self._joystick.get_guid()
             except AttributeError:
-                # get_instance_id() is an SDL2 method
-                self._joy_id = self._joystick.get_id()
-
-            # Get the name from the OS for the controller/joystick.
-            self._name = self._joystick.get_name()
-            if Settings.USB_NAME in self._name:
-                print("Gamepad found")
-                try:
-                    self._guid = self._joystick.get_guid()
-                except AttributeError:
-                    # get_guid() is an SDL2 method
-                    pass
-
-                # Usually axis run in pairs, up/down for one, and left/right for the other.
-                self._axes_qty = self._joystick.get_numaxes()
-
-                self._buttons_qty = self._joystick.get_numbuttons()
-
-                # hats = self._joystick.get_numhats()
-                # for i in range(hats):
-                #     hat = self._joystick.get_hat(i)
-
-                return  # our joystick was found
-        print("Gamepad not found")
+                # get_guid() is an SDL2 method
+                pass
+
+            # Usually axis run in pairs, up/down for one, and left/right for the other.
+            self._axes_qty = self._joystick.get_numaxes()
+
+            self._buttons_qty = self._joystick.get_numbuttons()
+
+            # from now, state is changed only by events (see update)
+            self._state_buttons = [self._joystick.get_button(x) for x in range(self._buttons_qty)]
+            self._state_axes = [self.__axis_adjust(self._joystick.get_axis(x)) for x in range(self._axes_qty)]
+
+            # hats = self._joystick.get_numhats()
+            # for i in range(hats):
+            #     hat = self._joystick.get_hat(i)
+
+            return True
         self._name = ''
+        return False
 
     # check if pad can be used as regular joystick
     def is_open(self):
@@ -124,4 +182,58 @@ class Joystick:
             # print("Can't read axes. Gamepad not found.")
             return 0, 0
 
-
+    # take events of our joystick (JOYBUTTONDOWN, JOYBUTTONUP, JOYAXISMOTION) and make new JoystickState.
+    # Run it once per frame. If game reads events by itself (pygame.event.get), pass them in <events>,
+    # otherwise only joystick events are taken from pygame queue, the others stay there.
+    # Pad is opened again, when it is plugged in (JOYDEVICEADDED) after it was disconnected (JOYDEVICEREMOVED).
+    def update(self, events=None):
+        if events is None:
+            events = pygame.event.get(JOYSTICK_EVENTS)
+        time_now = timer()
+        pressed = set()
+        released = set()
+        changes = []
+
+        for event in events:
+            if event.type == JOYSTICK_DEVICE_EVENTS[0]:
+                if not self.is_open():
+                    self.__joystick_open(event.device_index)
+                continue
+            if event.type not in JOYSTICK_EVENTS or not self.is_open():
+                continue
+            if getattr(event, "instance_id", getattr(event, "joy", None)) != self._joy_id:
+                continue
+            if event.type == JOYSTICK_DEVICE_EVENTS[1]:
+                print("Gamepad disconnected")
+                self._name = ''
+                self._state_buttons = []
+                self._state_axes = []
+                continue
+            if event.type == pygame.JOYAXISMOTION:
+                if event.axis >= self._axes_qty:
+                    continue
+                value = self.__axis_adjust(event.value)
+                if value == self._state_axes[event.axis]:
+                    continue  # move inside dead zone
+                self._state_axes[event.axis] = value
+                index = PadAxis(event.axis) if event.axis in PAD_AXES else event.axis
+                self._axis_times[index] = time_now
+            else:
+                if event.button >= self._buttons_qty:
+                    continue
+                value = int(event.type == pygame.JOYBUTTONDOWN)
+                self._state_buttons[event.button] = value
+                index = PadKey(event.button) if event.button in PAD_BUTTONS else event.button
+                (pressed if value else released).add(index)
+                self._button_times[index] = time_now
+            changes.append((time_now, event.type, index, value))
+
+        buttons = [self._state_buttons[x] if x < len(self._state_buttons) else 0 for x in PAD_BUTTONS]
+        axes = [self._state_axes[x] if x < len(self._state_axes) else 0 for x in PAD_AXES]
+        self._state = JoystickState(buttons, axes, frozenset(pressed), frozenset(released), changes,
+                                    dict(self._button_times), dict(self._axis_times), time_now)
+        return self._state
+
+    # state made by the last update
+    def state_get(self):
+        return self._state
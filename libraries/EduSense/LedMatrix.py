@@ -1,8 +1,12 @@
+import heapq
 from enum import Enum
+from numbers import Real
 from timeit import default_timer as timer
 
 from libraries.EduSense import Settings
 
+LED_BULK_CHANGES_MIN = 2  # from this number of changed LEDs, whole matrix is sent by one command
+
 
 class Status(Enum):
     OFF = 0
@@ -18,57 +22,105 @@ class LedMatrix:
         self._matrix_todo = [[Status.OFF] * Settings.MATRIX_Y_SIZE for i in range(Settings.MATRIX_X_SIZE)]
         self._matrix_sequence = [[0] * Settings.MATRIX_Y_SIZE for i in range(Settings.MATRIX_X_SIZE)]
         self._matrix_step = [[0] * Settings.MATRIX_Y_SIZE for i in range(Settings.MATRIX_X_SIZE)]
-        self._matrix_tick = [[timer()] * Settings.MATRIX_Y_SIZE for i in range(Settings.MATRIX_X_SIZE)]
+        # time of next change of blinking LED, None if LED doesn't blink
+        self._matrix_tick = [[None] * Settings.MATRIX_Y_SIZE for i in range(Settings.MATRIX_X_SIZE)]
+        self._matrix_shown = [0] * Settings.MATRIX_X_SIZE  # bitmap sent to pad (column by column)
+        self._bitmap = [0] * Settings.MATRIX_X_SIZE  # bitmap, which should be shown right now
+        self._todo = set()  # LEDs changed by pixel_set or clear, not processed by update yet
+        self._blink_queue = []  # heap of (time of next change, x, y) of blinking LEDs
 
     # run this function periodically to continuously update LED on matrix
     def update(self):
+        time_now = timer()
+        forced = [0] * Settings.MATRIX_X_SIZE  # LEDs which have to be sent, even if they look the same
+
         # check for LEDs for update
+        for x, y in self._todo:
+            if self._matrix_now[x][y] == Status.DUMMY:
+                forced[x] |= 1 << y
+            self._matrix_now[x][y] = self._matrix_todo[x][y]
+            self._matrix_tick[x][y] = None
+
+            if self._matrix_todo[x][y] == Status.BLINK:
+                self._matrix_step[x][y] = 0
+                self.__blink_schedule(x, y, time_now)
+            self.__bitmap_set(x, y, self._matrix_todo[x][y] != Status.OFF)
+        self._todo.clear()
+
+        # now, is necessary to check blinking LEDs, but only these, which time has come
+        queue = self._blink_queue
+        while queue and queue[0][0] < time_now:
+            tick, x, y = heapq.heappop(queue)
+            if self._matrix_tick[x][y] != tick:  # LED was changed in the meantime
+                continue
+            self._matrix_step[x][y] = (self._matrix_step[x][y] + 1) % len(self._matrix_sequence[x][y])
+            self.__blink_schedule(x, y, time_now)
+            self.__bitmap_set(x, y, self._matrix_step[x][y] % 2 == 0)
+
+        self.__show(list(self._bitmap), forced)
+
+    # time (the same as timeit.default_timer) when update should be called next time, None if nothing is waiting
+    def next_deadline_get(self):
+        if self._todo:
+            return timer()
+        while self._blink_queue:
+            tick, x, y = self._blink_queue[0]
+            if self._matrix_tick[x][y] == tick:
+                return tick
+            heapq.heappop(self._blink_queue)  # rid of entries of LEDs changed in the meantime
+        return None
+
+    # how long caller can sleep before next update, None if nothing is waiting
+    def sleep_time_get(self):
+        deadline = self.next_deadline_get()
+        if deadline is None:
+            return None
+        return max(0, deadline - timer())
+
+    def __blink_schedule(self, x, y, time_now):
+        tick = time_now + self._matrix_sequence[x][y][self._matrix_step[x][y]]
+        self._matrix_tick[x][y] = tick
+        heapq.heappush(self._blink_queue, (tick, x, y))
+
+    def __bitmap_set(self, x, y, on):
+        if on:
+            self._bitmap[x] |= 1 << y
+        else:
+            self._bitmap[x] &= ~(1 << y)
+
+    # send to pad only what differs from the last shown bitmap. Few changes are sent LED by LED,
+    # more of them at once by one LED_MATRIX command, which costs the same as single LED_ON
+    def __show(self, bitmap, forced):
+        changes = [(self._matrix_shown[x] ^ bitmap[x]) | forced[x] for x in range(Settings.MATRIX_X_SIZE)]
+        changes_qty = sum(bin(x).count("1") for x in changes)
+        if not changes_qty:
+            return
+
+        if changes_qty >= LED_BULK_CHANGES_MIN:
+            if self._port.cmd_matrix_by_columns(bitmap):
+                self._matrix_shown = bitmap
+            return
+
         for x in range(Settings.MATRIX_X_SIZE):
             for y in range(Settings.MATRIX_Y_SIZE):
-                if self._matrix_todo[x][y] != self._matrix_now[x][y]:
-                    if self._matrix_todo[x][y] == Status.ON:
-                        self._port.cmd_led_turn_on(x, y)
-                        self._matrix_now[x][y] = Status.ON
-                        continue
-
-                    if self._matrix_todo[x][y] == Status.OFF:
-                        self._port.cmd_led_turn_off(x, y)
-                        self._matrix_now[x][y] = Status.OFF
-                        continue
-
-                    if self._matrix_todo[x][y] == Status.BLINK:
-                        self._port.cmd_led_turn_on(x, y)
-                        self._matrix_now[x][y] = Status.BLINK
-                        self._matrix_step[x][y] = 0
-                        self._matrix_tick[x][y] = timer()
-                        continue
-
-        # now, is necessary to check current steps of blinking
-        for x in range(Settings.MATRIX_X_SIZE):
-            for y in range(Settings.MATRIX_Y_SIZE):
-                if self._matrix_now[x][y] == Status.BLINK:
-                    try:
-                        step = self._matrix_step[x][y]
-                        if timer() - self._matrix_tick[x][y] > self._matrix_sequence[x][y][step]:
-                            seq_qty = len(self._matrix_sequence[x][y])
-                            self._matrix_step[x][y] = (self._matrix_step[x][y] + 1) % seq_qty
-                            step = self._matrix_step[x][y]
-                            if (step % 2) == 0:
-                                self._port.cmd_led_turn_on(x, y)
-                            else:
-                                self._port.cmd_led_turn_off(x, y)
-                            self._matrix_tick[x][y] = timer()
-                    except:
-                        self._matrix_todo[x][y] = Status.OFF
-                        self._port.cmd_led_turn_off(x, y)
-                        print("Error during blinking on Led matrix. Led will be off:", x, ":", y)
-                        continue
+                if changes[x] & (1 << y):
+                    if bitmap[x] & (1 << y):
+                        is_ok = self._port.cmd_led_turn_on(x, y)
+                    else:
+                        is_ok = self._port.cmd_led_turn_off(x, y)
+                    if is_ok:
+                        self._matrix_shown[x] = (self._matrix_shown[x] & ~(1 << y)) | (bitmap[x] & (1 << y))
 
     # set properties for LED on maxtrix
     def pixel_set(self, kind, x, y, *data):
+        for element in data:
+            if not isinstance(element, Real) or element < 0:
+                raise ValueError("Incorrect time in blinking sequence")
+
         self._matrix_sequence[x][y] = [0, 0]
         self._matrix_todo[x][y] = kind
         self._matrix_now[x][y] = Status.DUMMY  # forcing LED refresh
+        self._todo.add((x, y))
 
         # add new sequence
         for element in data:
@@ -84,12 +136,21 @@ class LedMatrix:
         if data_qty > 2:
             del (self._matrix_sequence[x][y])[0:2]
 
+    # show part of frame buffer (FrameBuffer.FrameBuffer) starting at x, y. LEDs are set ON or OFF, blinking is stopped
+    def frame_show(self, frame, x=0, y=0):
+        columns = frame.columns_get(x, y, Settings.MATRIX_X_SIZE)
+        for i in range(Settings.MATRIX_X_SIZE):
+            for j in range(Settings.MATRIX_Y_SIZE):
+                kind = Status.ON if columns[i] & (1 << j) else Status.OFF
+                if self._matrix_todo[i][j] != kind:
+                    self._matrix_todo[i][j] = kind
+                    self._matrix_sequence[i][j] = [0, 0]
+                    self._todo.add((i, j))
+
     # clear whole matrix
     def clear(self):
         for x in range(Settings.MATRIX_X_SIZE):
             for y in range(Settings.MATRIX_Y_SIZE):
                 self._matrix_todo[x][y] = Status.OFF
                 self._matrix_now[x][y] = Status.DUMMY
-
-
-
+                self._todo.add((x, y))
@@ -0,0 +1,285 @@
+import hashlib
+import marshal
+import os
+import re
+import struct
+
+from libraries.EduSense.Sound import Note
+from libraries.EduSense.Sound import Tones
+
+# Import of melodies from RTTTL (ringtone) strings and MIDI files into the same format as Sound.MELODY_SAMPLE_INTRO:
+# tone (Tones, in 0,01kHz), duration (Note, in 0,01s), tone, duration...
+#
+#   melody = Melody.rtttl_parse("intro:d=4,o=5,b=120:c,e,f,2g")
+#   melodies = Melody.library_load("music/jingles.txt")   # {name: melody}, one RTTTL string per line
+#   melody = Melody.midi_load("music/theme.mid")
+#
+# Loaded files are compiled once and kept in cache (in __melodycache__ next to file). Name of cache file is hash
+# of content of source file, so changed file is compiled again, and copies of the same file use the same cache.
+
+MELODY_CACHE_DIR = "__melodycache__"
+MELODY_CACHE_VERSION = 1  # change it, when format of compiled melodies changes
+MELODY_VALUE_MAX = 0xFF  # tone and duration are sent as bytes
+MIDI_DRUMS_CHANNEL = 9  # channel 10 is percussion, it has no tones
+
+RTTTL_NOTES = {"c": 0, "d": 2, "e": 4, "f": 5, "g": 7, "a": 9, "b": 11, "h": 11}
+_RTTTL_NOTE = re.compile(r"^(\d*)([a-hp])(#?)(\.?)(\d*)(\.?)$")
+
+_tones_by_value = {x.value: x for x in Tones}
+_notes_by_value = {x.value: x for x in Note}
+
+
+def _midi_note_get(tone_name):
+    # "CS4" -> 61
+    letter, octave = tone_name[:-1], int(tone_name[-1])
+    return 12 * (octave + 1) + RTTTL_NOTES[letter[0].lower()] + (letter[1:] == "S")
+
+
+# the same frequencies as in hand made melodies
+_tones_by_midi_note = {_midi_note_get(x.name): x.value for x in Tones if x.value}
+
+
+# frequency of MIDI note, in 0,01kHz. Notes too high for pad are moved one octave down, until they fit
+def tone_get(midi_note):
+    if midi_note in _tones_by_midi_note:
+        return _tones_by_midi_note[midi_note]
+    tone = round(440 * 2 ** ((midi_note - 69) / 12) / 10)
+    while tone > MELODY_VALUE_MAX:
+        midi_note -= 12
+        tone = round(440 * 2 ** ((midi_note - 69) / 12) / 10)
+    return max(1, tone)
+
+
+# [(tone, start [s], end [s])] -> melody. Times are rounded to 0,01s, but end of every note is rounded
+# (not its duration), so rounding errors don't add up in long melodies
+def _quantize(notes):
+    melody = []
+    position = 0  # [0,01s]
+    for tone, start, end in notes:
+        start = round(start * 100)
+        end = round(end * 100)
+        if start > position:
+            _append(melody, 0, start - position)
+            position = start
+        if end > position:
+            _append(melody, tone, end - position)
+            position = end
+    return melody
+
+
+def _append(melody, tone, duration):
+    if melody and tone == 0 and melody[-2] == 0:  # join pauses
+        duration += melody[-1]
+        del melody[-2:]
+    while duration > 0:  # too long note is played as few shorter ones
+        melody += [tone, min(duration, MELODY_VALUE_MAX)]
+        duration -= MELODY_VALUE_MAX
+
+
+# values replaced by Tones and Note, where they have names
+def _named(melody):
+    result = list(melody)
+    result[0::2] = [_tones_by_value.get(x, x) for x in melody[0::2]]
+    result[1::2] = [_notes_by_value.get(x, x) for x in melody[1::2]]
+    return result
+
+
+# RTTTL: "name:d=4,o=5,b=63:8e6,8d#6,p,..." (default duration, octave and tempo, then list of notes)
+def rtttl_parse(text):
+    return _named(_rtttl_compile(text)[1])
+
+
+def _rtttl_compile(text):
+    parts = text.strip().split(":")
+    if len(parts) != 3:
+        raise ValueError("Incorrect RTTTL melody: {}".format(text[:40]))
+    name, settings, notes_text = parts
+
+    defaults = {"d": 4, "o": 6, "b": 63}
+    for setting in settings.split(","):
+        if "=" in setting:
+            key, value = setting.split("=", 1)
+            defaults[key.strip().lower()] = int(value)
+    if defaults["d"] <= 0 or defaults["b"] <= 0:
+        raise ValueError("Incorrect RTTTL settings: {}".format(settings))
+    whole = 4 * 60 / defaults["b"]  # [s] time of whole note, tempo is in quarter notes per minute
+
+    notes = []
+    time = 0
+    for note_text in notes_text.lower().split(","):
+        note_text = note_text.strip()
+        if not note_text:
+            continue
+        match = _RTTTL_NOTE.match(note_text)
+        if match is None:
+            raise ValueError("Incorrect RTTTL note: {}".format(note_text))
+        duration, letter, sharp, dot1, octave, dot2 = match.groups()
+        if duration and int(duration) == 0:
+            raise ValueError("Incorrect RTTTL note: {}".format(note_text))
+        length = whole / int(duration or defaults["d"])
+        if dot1 or dot2:
+            length *= 1.5
+        if letter == "p":
+            tone = 0
+        else:
+            midi_note = 12 * (int(octave or defaults["o"]) + 1) + RTTTL_NOTES[letter] + len(sharp)
+            tone = tone_get(midi_note)
+        notes.append((tone, time, time + length))
+        time += length
+    return name.strip(), _quantize(notes)
+
+
+def _varlen_get(data, offset):
+    value = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, offset
+
+
+def _midi_track_events(data, offset, end):
+    # [(tick, kind, value)], kind: "tempo" (value in us per quarter note), "on", "off" (value is note)
+    events = []
+    tick = 0
+    status = 0
+    while offset < end:
+        delta, offset = _varlen_get(data, offset)
+        tick += delta
+        if data[offset] & 0x80:
+            status = data[offset]
+            offset += 1
+        if status == 0xFF:  # meta event
+            meta_type = data[offset]
+            length, offset = _varlen_get(data, offset + 1)
+            if meta_type == 0x51 and length == 3:
+                events.append((tick, "tempo", int.from_bytes(data[offset: offset + 3], "big")))
+            elif meta_type == 0x2F:  # end of track
+                break
+            offset += length
+            status = 0
+        elif status in (0xF0, 0xF7):  # system exclusive
+            length, offset = _varlen_get(data, offset)
+            offset += length
+            status = 0
+        else:
+            kind = status & 0xF0
+            channel = status & 0x0F
+            size = 1 if kind in (0xC0, 0xD0) else 2
+            params = data[offset: offset + size]
+            offset += size
+            if channel == MIDI_DRUMS_CHANNEL or kind not in (0x80, 0x90):
+                continue
+            if kind == 0x90 and params[1] > 0:
+                events.append((tick, "on", params[0]))
+            else:
+                events.append((tick, "off", params[0]))  # note on with velocity 0 is note off
+    return events
+
+
+# Simple MIDI (format 0 or 1). Pad plays one tone at a time, so when many notes sound together, the highest one
+# is played (melody is usually on top)
+def midi_parse(data):
+    return _named(_midi_compile(data))
+
+
+def _midi_compile(data):
+    if data[:4] != b"MThd":
+        raise ValueError("It is not MIDI file")
+    header_size, _, tracks_qty, division = struct.unpack(">IHHH", data[4:14])
+
+    events = []
+    offset = 8 + header_size
+    for _ in range(tracks_qty):
+        if data[offset: offset + 4] != b"MTrk":
+            break
+        size = struct.unpack(">I", data[offset + 4: offset + 8])[0]
+        events += _midi_track_events(data, offset + 8, offset + 8 + size)
+        offset += 8 + size
+    events.sort(key=lambda x: (x[0], x[1] != "off"))  # at the same time, notes are ended before new ones
+
+    if division & 0x8000:  # SMPTE: frames per second and ticks per frame
+        tick_time = 1 / ((256 - (division >> 8)) * (division & 0xFF))
+    else:
+        tick_time = 0.5 / division  # default tempo: 120 quarter notes per minute
+
+    notes = []
+    active = {}  # note -> how many times it was turned on
+    playing = None  # (tone, start)
+    time = 0
+    last_tick = 0
+    for tick, kind, value in events:
+        time += (tick - last_tick) * tick_time
+        last_tick = tick
+        if kind == "tempo":
+            if not division & 0x8000:
+                tick_time = value / 1000000 / division
+            continue
+        if kind == "on":
+            active[value] = active.get(value, 0) + 1
+        elif active.get(value):
+            active[value] -= 1
+            if not active[value]:
+                del active[value]
+
+        tone = tone_get(max(active)) if active else None
+        if playing is not None and playing[0] != tone:
+            notes.append((playing[0], playing[1], time))
+            playing = None
+        if playing is None and tone is not None:
+            playing = (tone, time)
+    if playing is not None:
+        notes.append((playing[0], playing[1], time))
+    return _quantize(notes)
+
+
+def _cache_path_get(path, data, cache_dir):
+    key = hashlib.sha1(data)
+    key.update("{}:{}".format(MELODY_CACHE_VERSION, marshal.version).encode())
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), MELODY_CACHE_DIR)
+    return os.path.join(cache_dir, key.hexdigest() + ".bin")
+
+
+# compiled content of file: {name: bytes of melody}, from cache if file was compiled before
+def _file_compile(path, compile_function, cache_dir):
+    with open(path, "rb") as file:
+        data = file.read()
+    cache_path = _cache_path_get(path, data, cache_dir)
+    try:
+        with open(cache_path, "rb") as file:
+            return marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    compiled = {name: bytes(melody) for name, melody in compile_function(data)}
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        with open(temp_path, "wb") as file:
+            marshal.dump(compiled, file)
+        os.replace(temp_path, cache_path)  # other process never sees half written file
+    except OSError:
+        print("Unable to write melody cache:", cache_path)
+    return compiled
+
+
+def _library_compile(data):
+    melodies = []
+    for line in data.decode("utf-8", "replace").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            melodies.append(_rtttl_compile(line))
+    return melodies
+
+
+# file with RTTTL melodies (one in line, lines starting with # are skipped) -> {name: melody}
+def library_load(path, cache_dir=None):
+    return {name: _named(melody) for name, melody in _file_compile(path, _library_compile, cache_dir).items()}
+
+
+# MIDI file -> melody
+def midi_load(path, cache_dir=None):
+    compiled = _file_compile(path, lambda data: [("", _midi_compile(data))], cache_dir)
+    return _named(compiled[""])
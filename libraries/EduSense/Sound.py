@@ -1,8 +1,13 @@
 
+from collections import deque
 from enum import IntEnum
+from functools import lru_cache
+from timeit import default_timer as timer
 
 TONES_QTY_MAX = 16          # how many tones will come into one UART command
 TONES_TEMPO_COEF = 1        # sound tempo coef
+SOUND_LEAD_TIME = 0.3       # [s] next part of melody is sent, when pad has less than this time to play
+SOUND_RETRY_TIME = 0.1      # [s] time to wait before sending again part of melody, which was rejected by pad
 
 
 class Note(IntEnum):   # duration (in 0,01s) of notes (note, half note, ...)
@@ -94,29 +99,90 @@ MELODY_SAMPLE_END_GAME = [
     Tones.C4, Note.N2,
 ]
 
-def play_tones(port, pause, *data):
+
+# melody (tone, duration, tone, duration...) compiled into data of SOUND_PLAY commands, up to TONES_QTY_MAX tones
+# in every one. Result is tuple of (data, duration of playing [s]). Compiled melodies are cached, so the same
+# melody is compiled only once.
+def melody_compile(melody, pause=0):
+    return _melody_compile(tuple(int(x) for x in melody), int(pause or 0))  # None means no pause
+
+
+@lru_cache(maxsize=32)
+def _melody_compile(melody, pause):
+    chunks = []
     data_set = []
     tone_counter = 0
-    data_list = list(*data)
     i = 0
-    while i < (len(data_list) - 1):
+    while i < (len(melody) - 1):
         if tone_counter < TONES_QTY_MAX:
-            data_set.append(data_list[i])
-            data_set.append(int(data_list[i + 1] / TONES_TEMPO_COEF))
+            data_set.append(melody[i])
+            data_set.append(int(melody[i + 1] / TONES_TEMPO_COEF))
             i += 2
             tone_counter += 1
 
             if pause and tone_counter < TONES_QTY_MAX:
-                data_set.append(0) # freq = 0 means silent
+                data_set.append(0)  # freq = 0 means silent
                 data_set.append(pause)
                 tone_counter += 1
         else:
-            port.send("SOUND_PLAY", data_set)
+            chunks.append(data_set)
             data_set = []
             tone_counter = 0
     # if remained any not sent data, do it now
     if len(data_set):
-        port.send("SOUND_PLAY", data_set)
+        chunks.append(data_set)
+    return tuple((tuple(x), sum(x[1::2]) / 100) for x in chunks)  # duration is in 0,01s
+
+
+# send whole melody at once. Caller waits until all parts are sent, use SoundSequencer to avoid it
+def play_tones(port, pause, *data):
+    for data_set, _ in melody_compile(list(*data), pause):
+        port.send("SOUND_PLAY", list(data_set))
+
+
+# Plays melodies without blocking of game loop. Parts of compiled melody are sent one by one, only when pad
+# is going to finish playing of previous ones, so other commands (LEDs, buttons) are sent in the meantime.
+# Run <update> periodically (like LedMatrix.update). With port in pipeline mode (Uart.pipeline_start)
+# sending doesn't even wait for answer.
+class SoundSequencer:
+    def __init__(self, port):
+        self._port = port
+        self._queue = deque()  # (data, duration) waiting for sending
+        self._play_end = 0  # time when pad finishes playing of what was sent to it
+        self._next_send = 0  # time when next part can be sent
+
+    # add melody to the end of queue
+    def play(self, melody, pause=0):
+        self._queue.extend(melody_compile(melody, pause))
+
+    # forget melodies, which weren't sent yet. What is in pad already, will be played to the end
+    def stop(self):
+        self._queue.clear()
+
+    def is_playing(self):
+        return bool(self._queue) or timer() < self._play_end
 
+    # send next parts of melody, if it's time for them
+    def update(self):
+        time_now = timer()
+        while self._queue and time_now >= self._next_send:
+            data_set, duration = self._queue[0]
+            if not self._port.cmd_sound_play(list(data_set)):
+                self._next_send = time_now + SOUND_RETRY_TIME
+                return
+            self._queue.popleft()
+            self._play_end = max(self._play_end, time_now) + duration
+            self._next_send = self._play_end - SOUND_LEAD_TIME
 
+    # time (the same as timeit.default_timer) when update should be called next time, None if nothing is waiting
+    def next_deadline_get(self):
+        if not self._queue:
+            return None
+        return self._next_send
 
+    # how long caller can sleep before next update, None if nothing is waiting
+    def sleep_time_get(self):
+        deadline = self.next_deadline_get()
+        if deadline is None:
+            return None
+        return max(0, deadline - timer())
@@ -1,3 +1,8 @@
+import binascii
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, wait
 from ctypes import *
 from ctypes import c_char, c_ubyte
 from timeit import default_timer as timer
@@ -9,6 +14,11 @@ import serial.tools.list_ports
 from libraries.EduSense import General
 from libraries.EduSense import Settings
 
+try:
+    import termios
+    _PORT_ERRORS = (serial.SerialException, OSError, termios.error)  # errors of disconnected port
+except ImportError:  # there is no termios on Windows
+    _PORT_ERRORS = (serial.SerialException, OSError)
 
 UART_WAIT_TIME_FOR_ANSWER = (100 / 1000)  # [s] czas oczekiwania na odpowiedź z urządzenia
 UART_DATA_SIZE_MAX = 200  # max. liczba danych w ramce do i z urządzenia
@@ -105,43 +115,383 @@ uart_cmd_list = [
 ]
 
 
+_HEX_WIDTH = {'N': 1, 'B': 2, 'I': 4}
+_HEX_DIGITS = b"0123456789ABCDEF"  # only these are sent by pad (int(..., 16) takes also spaces, '_', lowercase)
+
+
+def _compile_pass(frame_format):
+    # turn one pass over DATA FORMAT into list of (letter, count). Only 'C' has count > 1 (chars in one word),
+    # SPACE is used only to split words, so it doesn't get own operation
+    ops = []
+    chars = 0
+    for element in frame_format:
+        letter = element.upper()
+        if letter == 'C':
+            chars += 1
+            continue
+        if chars:
+            ops.append(('C', chars))
+            chars = 0
+        if letter != ' ':
+            ops.append((letter, 1))
+    if chars:
+        ops.append(('C', chars))
+    return ops
+
+
+def _compile_format(frame_format):
+    # first pass takes lowercase elements, next passes (repeated up to end of data) take uppercase ones
+    head = _compile_pass([x for x in frame_format if not x.isupper()])
+    loop = _compile_pass([x for x in frame_format if not x.islower()])
+    # uppercase section made from one kind of number (i.e. "B" or "BB") can be converted in bulk
+    letters = {letter for letter, _ in loop}
+    bulk = letters.pop() if len(letters) == 1 and letters <= set(_HEX_WIDTH) else None
+    return head, loop, bulk
+
+
+def _hex_to_int(text):
+    if text and not text.strip(_HEX_DIGITS):
+        return int(text, 16)
+    return General.ascii_to_int(text)
+
+
+def _encode_ops(ops, datas, idx, out):
+    datas_qty = len(datas)
+    for letter, count in ops:
+        if idx >= datas_qty:
+            break
+        if letter == 'N':
+            out.append(b"%01X" % datas[idx])
+        elif letter == 'B':
+            out.append(b"%02X" % datas[idx])
+        elif letter == 'I':
+            out.append(b"%04X" % datas[idx])
+        elif letter == 'C':
+            out.append(datas[idx][:count].encode('ascii'))
+        # 'X' and other chars only skip one var
+        idx += 1
+    return idx
+
+
+def _encode_bulk(letter, datas):
+    width = _HEX_WIDTH[letter]
+    if min(datas) < 0 or max(datas) >= 1 << 4 * width:
+        # value doesn't fit into its field - it is formatted the same way as by _encode_ops, without exception
+        return b"".join(b"%0*X" % (width, x) for x in datas)
+    if letter == 'B':
+        return binascii.hexlify(bytes(datas)).upper()
+    if letter == 'I':
+        return binascii.hexlify(struct.pack(">%dH" % len(datas), *datas)).upper()
+    return binascii.hexlify(bytes(datas)).upper()[1::2]  # 'N': only low nibble of every byte
+
+
+def _decode_ops(ops, data, offset, results):
+    end_offset = len(data)
+    for letter, count in ops:
+        if offset >= end_offset:
+            break
+        if letter in _HEX_WIDTH:
+            width = _HEX_WIDTH[letter]
+            results.append(_hex_to_int(data[offset: offset + width]))
+            offset += width
+        elif letter == 'C':
+            text = data[offset: offset + count].decode('latin-1')
+            offset += len(text)
+            if offset < end_offset:  # word is complete only if something is behind it
+                results.append(text)
+        else:
+            # 'X' and other chars only skip one char from frame
+            offset += 1
+    return offset
+
+
+def _decode_bulk(letter, data):
+    width = _HEX_WIDTH[letter]
+    if width > 1 and len(data) % width == 0 and not data.strip(_HEX_DIGITS):
+        raw = binascii.unhexlify(data)
+        if width == 4:
+            return list(struct.unpack(">%dH" % (len(raw) // 2), raw))
+        return list(raw)
+    return [_hex_to_int(data[i: i + width]) for i in range(0, len(data), width)]
+
+
+def _encode_plan(plan, datas):
+    head, loop, bulk = plan
+    out = []
+    idx = _encode_ops(head, datas, 0, out)
+    if idx < len(datas) and loop:
+        if bulk:
+            out.append(_encode_bulk(bulk, datas[idx:]))
+        else:
+            while idx < len(datas):
+                idx = _encode_ops(loop, datas, idx, out)
+    return b"".join(out)
+
+
+def _decode_plan(plan, data):
+    head, loop, bulk = plan
+    results = []
+    offset = _decode_ops(head, data, 0, results)
+    if offset < len(data) and loop:
+        if bulk:
+            results.extend(_decode_bulk(bulk, data[offset:]))
+        else:
+            while offset < len(data):
+                offset = _decode_ops(loop, data, offset, results)
+    return results
+
+
+class UartCodec:
+    # encode/decode plan for one command from uart_cmd_list. It is compiled only once, at import.
+    def __init__(self, name, number, tx_format, rx_format):
+        self.name = name
+        self.number = number
+        self.cmd = "{:02X}".format(number).encode("ascii")
+        self.tx_format = tx_format
+        self.rx_format = rx_format
+        self._tx_plan = _compile_format(tx_format)
+        self._rx_plan = _compile_format(rx_format)
+
+    # convert vars passed to <send> into ASCII data of frame (without STX, frame counter, command and ETX)
+    def encode(self, datas):
+        return _encode_plan(self._tx_plan, datas)
+
+    # convert ASCII data of received frame (without ETX) into list of values
+    def decode(self, data):
+        return _decode_plan(self._rx_plan, data)
+
+    # the same as <decode> and <encode>, but for the other side of link (used by emulator of pad)
+    def decode_request(self, data):
+        return _decode_plan(self._tx_plan, data)
+
+    def encode_answer(self, datas):
+        return _encode_plan(self._rx_plan, datas)
+
+
+uart_codecs = {x[0]: UartCodec(*x) for x in uart_cmd_list}
+
+
+# get list of values from data of received frame (without STX, frame counter, command and ETX)
+def frame_get_values(cmd_name, data):
+    # the response with the error number may be in a different format than standard response (like button status)
+    # therefore we have to analyze it separately.
+    if data[:1] == b'E':
+        if len(data) == 3:  # error is always 3 chars long
+            return True, ['E', _hex_to_int(data[1: 1 + 2])]
+        return False, []
+    return True, uart_codecs[cmd_name].decode(data)
+
+
+# get frame counter from complete frame (from STX to ETX)
+def frame_cnt_get(frame):
+    return _hex_to_int(frame[1:3])
+
+
+# get error number from answer, 0 means no error
+def rx_error_get(results):
+    if len(results) == 2 and results[0] == 'E':
+        return results[1]
+    return 0
+
+
+# make complete frame (from STX to ETX) ready to write to port. None if data don't fit into one frame
+def frame_build(frame_cnt, cmd_name, datas):
+    codec = uart_codecs[cmd_name]
+    data = codec.encode(datas)
+    if len(data) > UART_DATA_SIZE_MAX - 1 - 2 - 2 - 1 - 1:
+        print("Error: too much data for one frame:", cmd_name)
+        return None
+    return b"%c%02X%s%s%c" % (ASCII_STX, frame_cnt, codec.cmd, data, ASCII_ETX)
+
+
+# below are checks and conversions of parameters and results shared by Uart and AsyncUart
+def led_coords_check(x, y):
+    if x >= Settings.MATRIX_X_SIZE or y >= Settings.MATRIX_Y_SIZE:
+        print("Wrong coordinates of LED diode")
+        return False
+    return True
+
+
+def exp_pin_check(pin):
+    if pin != 1 and pin != 2:
+        print("Incorrect pin number")
+        return False
+    return True
+
+
+def matrix_rows_to_columns(*data):
+    matrix_v = [0] * 8
+    matrix_h = General.vars_to_list(*data)
+    bit_number = 0
+
+    for row in matrix_h:
+        for i in range(8):
+            if row & (1 << i):
+                matrix_v[i] |= (1 << bit_number)
+        bit_number += 1
+    return matrix_v
+
+
+def joystick_axes_get(results):
+    direction_x = results[1] / 0xFF * 2 - 1
+    if abs(direction_x) < Settings.JOYSTICK_DEAD_ZONE:
+        direction_x = 0
+
+    direction_y = results[2] / 0xFF * 2 - 1
+    if abs(direction_y) < Settings.JOYSTICK_DEAD_ZONE:
+        direction_y = 0
+    return [direction_x, direction_y]
+
+
+def virt_params_limit(*data):
+    param_list = General.vars_to_list(*data)
+    # limit value for XY position
+    if param_list[0] > Settings.VIRT_SCREEN_X_SIZE:
+        param_list[0] = Settings.VIRT_SCREEN_X_SIZE
+    if param_list[1] > Settings.VIRT_SCREEN_Y_SIZE:
+        param_list[1] = Settings.VIRT_SCREEN_Y_SIZE
+    # limit size of virt screen
+    if param_list[2] > Settings.VIRT_SCREEN_X_SIZE:
+        param_list[2] = Settings.VIRT_SCREEN_X_SIZE
+    if param_list[3] > Settings.VIRT_SCREEN_Y_SIZE:
+        param_list[3] = Settings.VIRT_SCREEN_Y_SIZE
+    # limit parameter roll
+    param_list[4] = int(param_list[4] != 0)
+    # limit data with pixels
+    for i in range(5, len(param_list)):
+        param_list[i] &= 0xFF
+    return param_list
+
+
+def virt_show_params_limit(*data):
+    param_list = General.vars_to_list(*data)
+    # limit value of XY position
+    if param_list[0] > Settings.VIRT_SCREEN_X_SIZE:
+        param_list[0] = Settings.VIRT_SCREEN_X_SIZE
+    if param_list[1] > Settings.VIRT_SCREEN_Y_SIZE:
+        param_list[1] = Settings.VIRT_SCREEN_Y_SIZE
+    # limit parameter roll
+    param_list[2] = int(param_list[2] != 0)
+    return param_list
+
+
+# searching for USB device with VID/PID correspond to our pad designators.
+def device_find():
+    for port_search in serial.tools.list_ports.comports():
+        if port_search.vid == Settings.USB_VID and port_search.pid == Settings.USB_PID:
+            return port_search.device
+    return None
+
+
+class FrameParser:
+    # incremental STX ... ETX frame parser. Data can come in any pieces, part of frame is kept between calls of <feed>
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def reset(self):
+        self._buffer.clear()
+
+    # add received data, return list of complete frames (from STX to ETX, both included)
+    def feed(self, data):
+        frames = []
+        buffer = self._buffer
+        buffer += data
+        while True:
+            etx = buffer.find(ASCII_ETX)
+            if etx < 0:
+                break
+            # every STX starts frame from the beginning, so frame begins at last STX before ETX
+            stx = buffer.rfind(ASCII_STX, 0, etx)
+            if stx >= 0 and etx + 1 - stx <= UART_DATA_SIZE_MAX:
+                frames.append(bytes(buffer[stx: etx + 1]))
+            del buffer[:etx + 1]
+
+        # rid of chars which are not part of any frame
+        stx = buffer.rfind(ASCII_STX)
+        if stx < 0 or len(buffer) - stx > UART_DATA_SIZE_MAX:
+            buffer.clear()
+        elif stx:
+            del buffer[:stx]
+        return frames
+
+
 def uart_cmd(name):
-    return [x[1] for x in uart_cmd_list if x[0] == name][0]
+    return uart_codecs[name].number
 
 
 def uart_cmd_tx_format(name):
-    return [x[2] for x in uart_cmd_list if x[0] == name]
+    return [uart_codecs[name].tx_format] if name in uart_codecs else []
 
 
 def uart_cmd_rx_format(name):
-    return [x[3] for x in uart_cmd_list if x[0] == name]
+    return [uart_codecs[name].rx_format] if name in uart_codecs else []
 
 
 class Uart:
     def __init__(self):
         self._port = None
         self._frame_received = Frame()
+        self._parser = FrameParser()
         self._frame_to_send = Frame()
         self._frame_cnt = 0
         self.__last_rx_error = 0
 
-    def open(self):
-        # searching for USB device with VID/PID correspond to our pad designators.
-        for port_search in serial.tools.list_ports.comports():
-            if port_search.vid == Settings.USB_VID and port_search.pid == Settings.USB_PID:
-                try:
-                    self._port = serial.Serial(port_search.device)
-                    print("Device connected to port:", port_search.device)
-                    return True
-                except:
-                    print("Unable to open port:", port_search.device)
-                    return False
-        if self._port is None:
+        # pipeline mode (background reader, many frames waiting for answer at the same time)
+        self._reader = None
+        self._reader_running = False
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()  # frame counter -> [future, command name, is answer awaited by sender]
+        self._oldest_since = 0
+        self._in_flight = None
+        self._pipeline_failed = 0
+
+    # open pad found by VID/PID, or given <device> (i.e. port of emulator or found by DeviceMonitor)
+    def open(self, device=None):
+        self.pipeline_stop()  # reader left after connection was lost
+        if device is None:
+            device = device_find()
+        if device is None:
             print("Pad not found. Please, check USB connection")
             return False
+        try:
+            # reading blocks (instead of polling) until something comes or time for answer will pass
+            self._port = serial.Serial(device, timeout=UART_WAIT_TIME_FOR_ANSWER)
+            print("Device connected to port:", device)
+            return True
+        except:
+            print("Unable to open port:", device)
+            return False
 
-    def close(self):
-        self._port.close()
+    # without <wait>, answers for frames sent in pipeline mode aren't waited for (i.e. when pad is already gone),
+    # they are finished as failed
+    def close(self, wait=True):
+        if wait or self._reader is None:
+            self.pipeline_stop()
+        else:
+            self._reader_running = False
+            if hasattr(self._port, "cancel_read"):
+                self._port.cancel_read()  # don't wait for timeout of reading
+        if self._port is not None:
+            self._port.close()
+        if self._reader is not None:
+            self._reader.join()
+            self._reader = None
+
+    # name of opened port, None if port isn't open
+    def device_get(self):
+        if self.is_open():
+            return self._port.port
+        return None
+
+    # port stopped working (i.e. cable was pulled out). It is closed, so it can be opened again (see DeviceMonitor)
+    def __port_lost(self):
+        print("Error: connection with pad lost")
+        port, self._port = self._port, None
+        self._reader_running = False
+        try:
+            port.close()
+        except _PORT_ERRORS:
+            pass
 
     def is_open(self):
         if self._port is None or not self._port.isOpen():
@@ -149,184 +499,185 @@ class Uart:
         else:
             return True
 
-    def send(self, cmd_name, *dane_in):
-        current_data_in_cnt = 0
-        current_buffer_offset = 0
+    # turn on pipeline mode. Frames are sent without waiting for previous answers (up to <max_in_flight>
+    # at the same time) and background thread matches answers with requests by frame counter
+    def pipeline_start(self, max_in_flight=8):
+        if self._reader is not None:
+            return True
+        if not self.is_open():
+            print("Port isn't ready. Can't start pipeline.")
+            return False
+        self._in_flight = threading.BoundedSemaphore(max(1, min(max_in_flight, 255)))
+        self._pipeline_failed = 0
+        self._port.reset_input_buffer()
+        self._parser.reset()
+        self._reader_running = True
+        self._reader = threading.Thread(target=self.__reader, name="Uart reader", daemon=True)
+        self._reader.start()
+        return True
+
+    # wait for all answers and go back to normal (request/response) mode
+    def pipeline_stop(self):
+        if self._reader is None:
+            return
+        self.flush()
+        self._reader_running = False
+        self._reader.join()
+        self._reader = None
+
+    def is_pipelined(self):
+        return self._reader is not None
+
+    # wait for answers for all frames sent in pipeline mode.
+    # Returns False if any command, which was sent without waiting for answer, failed since last flush
+    def flush(self):
+        if self._reader is None:
+            return True
+        with self._lock:
+            futures = [x[0] for x in self._pending.values()]
+        wait(futures)
+        with self._lock:
+            failed = self._pipeline_failed
+            self._pipeline_failed = 0
+        return failed == 0
+
+    def __frame_build(self, cmd_name, datas):
+        self._frame_cnt = (self._frame_cnt + 1) % 256
+        frame = frame_build(self._frame_cnt, cmd_name, datas)
+        if frame is not None:
+            memmove(self._frame_to_send.row, frame, len(frame))
+        return frame
 
+    def send(self, cmd_name, *dane_in):
         datas = General.vars_to_list(*dane_in)
 
-        self._frame_to_send.tx.STX = ASCII_STX
-        self._frame_cnt = (self._frame_cnt + 1) % 256
-        self._frame_to_send.tx.frame_cnt = "{:02X}".format(self._frame_cnt).encode("ascii")
-        self._frame_to_send.tx.cmd = "{:02X}".format(uart_cmd(cmd_name)).encode("ascii")
+        if self._reader is not None:
+            if not uart_codecs[cmd_name].rx_format:
+                # answer for this command is only confirmation, so we don't wait for it.
+                # If something goes wrong, it will be reported by <flush>
+                future = self.__send_pipelined(cmd_name, datas, False)
+                if future.done():  # frame wasn't sent (wrong data, port lost), or answer is already here
+                    is_ok, results = future.result()
+                    if not is_ok:
+                        return False, []
+                    self.__last_rx_error = rx_error_get(results)
+                    return True, results
+                self.__last_rx_error = 0
+                return True, []
+            is_ok, results = self.__send_pipelined(cmd_name, datas, True).result()
+            self.__last_rx_error = rx_error_get(results)
+            return is_ok, results
 
         if self.is_open():
-            self._port.reset_input_buffer()
-            frame_format = ''.join(uart_cmd_tx_format(cmd_name))
-            char_cnt = 0
-            first_time = True
-
-            while current_data_in_cnt < len(datas):
-                for element in frame_format:
-
-                    if current_data_in_cnt >= len(datas):
-                        break
-
-                    if first_time and element.isupper():
-                        continue
-                    if not first_time and element.islower():  # this is OK, because we have digits and special chars
-                        continue
-
-                    letter = element.upper()
-
-                    if letter == 'C':
-                        self._frame_to_send.tx.data[current_buffer_offset: current_buffer_offset + 1] = \
-                            datas[current_data_in_cnt][char_cnt].encode('ascii')
-                        char_cnt += 1
-                        current_buffer_offset += 1
-                        continue
-                    else:
-                        if char_cnt:
-                            char_cnt = 0
-                            current_data_in_cnt += 1
-                            if current_data_in_cnt >= len(datas):
-                                break
-
-                    if letter == 'N':
-                        self._frame_to_send.tx.data[current_buffer_offset: current_buffer_offset + 1] = \
-                            "{:01X}".format(datas[current_data_in_cnt]).encode("ascii")
-                        current_data_in_cnt += 1
-                        current_buffer_offset += 1
-                        continue
-
-                    if letter == 'B':
-                        self._frame_to_send.tx.data[current_buffer_offset: current_buffer_offset + 2] = \
-                            "{:02X}".format(datas[current_data_in_cnt]).encode("ascii")
-                        current_data_in_cnt += 1
-                        current_buffer_offset += 2
-                        continue
-
-                    if letter == 'I':
-                        self._frame_to_send.tx.data[current_buffer_offset: current_buffer_offset + 4] = \
-                            "{:04X}".format(datas[current_data_in_cnt]).encode("ascii")
-                        current_data_in_cnt += 1
-                        current_buffer_offset += 4
-                        continue
+            self._parser.reset()
+            frame = self.__frame_build(cmd_name, datas)
+            if frame is not None:
+                try:
+                    self._port.reset_input_buffer()
+                    self._port.write(frame)
+                    return self.__receive(cmd_name)
+                except _PORT_ERRORS:
+                    self.__port_lost()
+        else:
+            self._frame_cnt = (self._frame_cnt + 1) % 256
+        return False, []
 
-                    if letter == 'X':
-                        current_data_in_cnt += 1
+    # send frame and return future with (is_ok, results), the same as <send> returns.
+    # Without pipeline mode this is just <send>, so future is already done.
+    def send_async(self, cmd_name, *dane_in):
+        datas = General.vars_to_list(*dane_in)
+        if self._reader is None:
+            future = Future()
+            future.set_result(self.send(cmd_name, datas))
+            return future
+        return self.__send_pipelined(cmd_name, datas, True)
+
+    def __send_pipelined(self, cmd_name, datas, awaited):
+        future = Future()
+        self._in_flight.acquire()  # don't overflow device, if too many frames are waiting for answer
+        with self._lock:
+            frame = self.__frame_build(cmd_name, datas)
+            if frame is None or not self._reader_running:
+                self._in_flight.release()
+                future.set_result((False, []))
+                return future
+            if not self._pending:
+                self._oldest_since = timer()
+            self._pending[self._frame_cnt] = [future, cmd_name, awaited]
+            try:
+                self._port.write(frame)
+            except _PORT_ERRORS:
+                self.__port_lost()  # reader will finish all waiting frames
+        return future
+
+    def __pipeline_done(self, pending, is_ok, results):
+        future, cmd_name, awaited = pending
+        if not awaited and not (is_ok and rx_error_get(results) == 0):
+            self._pipeline_failed += 1
+            print("Error: command {} failed: {}".format(cmd_name, results))
+        self._in_flight.release()
+        future.set_result((is_ok, results))
+
+    def __reader(self):
+        while self._reader_running:
+            try:
+                # wait (on port timeout) for first char, then take at once everything what is waiting
+                received = self._port.read(self._port.in_waiting or 1)
+            except _PORT_ERRORS + (TypeError, AttributeError):
+                print("Error: port was closed while waiting for answers")
+                self._reader_running = False
+                break
+
+            with self._lock:
+                for frame in self._parser.feed(received):
+                    if len(frame) < 6:  # STX, frame counter, command, ETX
                         continue
-
-                    if letter == ' ':
+                    frame_cnt = frame_cnt_get(frame)
+                    pending = self._pending.pop(frame_cnt, None)
+                    if pending is None:
+                        print("Error: received unexpected frame numer:{}".format(frame_cnt))
                         continue
+                    memmove(self._frame_received.row, frame, len(frame))
+                    self.__pipeline_done(pending, *frame_get_values(pending[1], frame[5:-1]))
+                    self._oldest_since = timer()
 
-                    current_data_in_cnt += 1
+                # device answers in order, so only the oldest frame can be late
+                if self._pending and timer() - self._oldest_since > UART_WAIT_TIME_FOR_ANSWER:
+                    self.__pipeline_done(self._pending.popitem(last=False)[1], False, [])
+                    self._oldest_since = timer()
 
-                first_time = False
-            self._frame_to_send.tx.data[current_buffer_offset] = ASCII_ETX
-            end_idx = bytes(self._frame_to_send.row).find(ASCII_ETX)
-            if end_idx > -1:
-                self._port.write(self._frame_to_send.row[:end_idx + 1])
-                return self.__receive(cmd_name)
-        return False, []
+        with self._lock:
+            while self._pending:
+                self.__pipeline_done(self._pending.popitem(last=False)[1], False, [])
 
     def __receive(self, cmd_name):
         if self.is_open():
-            received_cnt = 0
-            time_start = timer()
-
-            while timer() - time_start < UART_WAIT_TIME_FOR_ANSWER:
-                if self._port.in_waiting:
-                    received_char = self._port.read()
-                    if received_char[0] == ASCII_STX:
-                        received_cnt = 0
-                    self._frame_received.row[received_cnt] = received_char[0]
-                    received_cnt += 1
-                    if self._frame_received.rx.STX == ASCII_STX and received_char[0] == ASCII_ETX:
-                        if int(self._frame_received.rx.frame_cnt, 16) != self._frame_cnt:
-                            print("Error: expected frame numer:{}, received:{}".format(
-                                int(self._frame_received.rx.frame_cnt, 16), self._frame_cnt))
-                            return False, []
-
-                        # OK, we have correct frame. Now, we will analyze it and will do list with answers
-                        return self.__receive_get_values(cmd_name)
+            time_end = timer() + UART_WAIT_TIME_FOR_ANSWER
+
+            while timer() < time_end:
+                # wait (on port timeout) for first char, then take at once everything what is waiting
+                received = self._port.read(self._port.in_waiting or 1)
+                for frame in self._parser.feed(received):
+                    if len(frame) < 6:  # STX, frame counter, command, ETX
+                        continue
+                    frame_cnt = frame_cnt_get(frame)
+                    if frame_cnt != self._frame_cnt:
+                        print("Error: expected frame numer:{}, received:{}".format(self._frame_cnt, frame_cnt))
+                        return False, []
+
+                    # OK, we have correct frame. Now, we will analyze it and will do list with answers
+                    memmove(self._frame_received.row, frame, len(frame))
+                    return self.__receive_get_values(cmd_name)
         return False, []
 
     def __receive_get_values(self, cmd_name):
-        results = []
-        current_offset = 0
-
         end_offset = bytes(self._frame_received.rx.data).find(ASCII_ETX)
         if not end_offset > -1:  # end of frame not found
             return False, []
 
-        frame_format = ''.join(uart_cmd_rx_format(cmd_name))
-        first_time = True
-        text = ''
-        self.__last_rx_error = 0
-
-        # the response with the error number may be in a different format than standard response (like button status)
-        # therefore we have to analyze it separately.
-        if self._frame_received.rx.data[0] == ord('E'):
-            if end_offset == 3:  # error is always 3 chars long
-                results.append('E')
-                self.__last_rx_error = General.ascii_to_int(self._frame_received.rx.data[1: 1 + 2])
-                results.append(self.__last_rx_error)
-            else:
-                return False, []
-        else:
-            while current_offset < end_offset:
-                for element in frame_format:
-                    if current_offset >= end_offset:
-                        break
-
-                    if first_time and element.isupper():
-                        continue
-                    if not first_time and element.islower():
-                        continue
-                    letter = element.upper()
-
-                    if letter == 'C':
-                        text += '%c' % (self._frame_received.rx.data[current_offset])
-                        current_offset += 1
-                        continue
-                    else:
-                        if len(text):
-                            results.append(text)
-                            text = ''
-
-                    if letter == 'N':
-                        value = General.ascii_to_int(
-                            self._frame_received.rx.data[current_offset: current_offset + 1])
-                        results.append(value)
-                        current_offset += 1
-                        continue
-
-                    if letter == 'B':
-                        value = General.ascii_to_int(
-                            self._frame_received.rx.data[current_offset: current_offset + 2])
-                        results.append(value)
-                        current_offset += 2
-                        continue
-
-                    if letter == 'I':
-                        value = General.ascii_to_int(
-                            self._frame_received.rx.data[current_offset: current_offset + 4])
-                        results.append(value)
-                        current_offset += 4
-                        continue
-
-                    if letter == 'X':
-                        current_offset += 1
-                        continue
-
-                    if letter == ' ':
-                        continue
-
-                    current_offset += 1
-                first_time = False
-
-        return True, results
+        is_ok, results = frame_get_values(cmd_name, bytes(self._frame_received.rx.data[:end_offset]))
+        self.__last_rx_error = rx_error_get(results)
+        return is_ok, results
 
     def last_error_get(self):
         return self.__last_rx_error
@@ -342,16 +693,14 @@ class Uart:
 
     # turn on LED on matrix
     def cmd_led_turn_on(self, x, y):
-        if x >= Settings.MATRIX_X_SIZE | y >= Settings.MATRIX_Y_SIZE:
-            print("Wrong coordinates of LED diode")
+        if not led_coords_check(x, y):
             return False
         is_ok, *_ = self.send("LED_ON", x, y)
         return is_ok and self.__last_rx_error == 0
 
     # turn off LED on matrix
     def cmd_led_turn_off(self, x, y):
-        if x >= Settings.MATRIX_X_SIZE | y >= Settings.MATRIX_Y_SIZE:
-            print("Wrong coordinates of LED diode")
+        if not led_coords_check(x, y):
             return False
         is_ok, *_ = self.send("LED_OFF", x, y)
         return is_ok and self.__last_rx_error == 0
@@ -363,17 +712,7 @@ class Uart:
 
     # store data on LED matrix row by row
     def cmd_matrix_by_rows(self, *data):
-        matrix_v = [0] * 8
-        matrix_h = General.vars_to_list(*data)
-        bit_number = 0
-
-        for row in matrix_h:
-            for i in range(8):
-                if row & (1 << i):
-                    matrix_v[i] |= (1 << bit_number)
-            bit_number += 1
-
-        is_ok, *_ = self.send("LED_MATRIX", matrix_v)
+        is_ok, *_ = self.send("LED_MATRIX", matrix_rows_to_columns(*data))
         return is_ok and self.__last_rx_error == 0
 
     # set global LED matrix intensity
@@ -385,24 +724,15 @@ class Uart:
 
     # get position of joystick axes
     def cmd_joystick_get(self):
-        results = []
         is_ok, results = self.send("JOYSTICK_GET")
 
         if is_ok and results[0] == 'D':
-            direction_x = results[1] / 0xFF * 2 - 1
-            if abs(direction_x) < Settings.JOYSTICK_DEAD_ZONE:
-                direction_x = 0
-
-            direction_y = results[2] / 0xFF * 2 - 1
-            if abs(direction_y) < Settings.JOYSTICK_DEAD_ZONE:
-                direction_y = 0
-            return True, [direction_x, direction_y]
+            return True, joystick_axes_get(results)
         else:
             return False, []
 
     # get status of all buttons on pad: UP, DOWN, LEFT, RIGHT, OK, JOY
     def cmd_buttons_get(self):
-        results = []
         is_ok, results = self.send("BUTTONS_GET")
 
         if is_ok and results[0] == 'D':
@@ -413,11 +743,9 @@ class Uart:
 
     # get status of one button on pad
     def cmd_button_get(self, color):
-        results = []
-        is_ok, results = self.send("BUTTONS_GET")
+        is_ok, results = self.cmd_buttons_get()
 
-        if is_ok and results[0] == 'D':
-            results.pop(0)
+        if is_ok:
             return True, [results[color]]
         else:
             return False, []
@@ -427,47 +755,24 @@ class Uart:
         is_ok, *_ = self.send("SOUND_PLAY", *data)
         return is_ok and self.__last_rx_error == 0
 
-    def __cmd_virt_operation_sub(self, *data):
-        param_list = General.vars_to_list(*data)
-        # limit value for XY position
-        if param_list[0] > Settings.VIRT_SCREEN_X_SIZE:
-            param_list[0] = Settings.VIRT_SCREEN_X_SIZE
-        if param_list[1] > Settings.VIRT_SCREEN_Y_SIZE:
-            param_list[1] = Settings.VIRT_SCREEN_Y_SIZE
-        # limit size of virt screen
-        if param_list[2] > Settings.VIRT_SCREEN_X_SIZE:
-            param_list[2] = Settings.VIRT_SCREEN_X_SIZE
-        if param_list[3] > Settings.VIRT_SCREEN_Y_SIZE:
-            param_list[3] = Settings.VIRT_SCREEN_Y_SIZE
-        # limit parameter roll
-        param_list[4] = int(param_list[4] != 0)
-        # limit data with pixels
-        for i in range(5, len(param_list)):
-            param_list[i] &= 0xFF
-        return param_list
-
     # write data (turn on and off) to virtual screen
     def cmd_virt_write(self, *data):
-        param_list = self.__cmd_virt_operation_sub(*data)
-        is_ok, *_ = self.send("VIRT_WRITE", param_list)
+        is_ok, *_ = self.send("VIRT_WRITE", virt_params_limit(*data))
         return is_ok and self.__last_rx_error == 0
 
     # turn on (only) data to virtual screen
     def cmd_virt_on(self, *data):
-        param_list = self.__cmd_virt_operation_sub(*data)
-        is_ok, *_ = self.send("VIRT_ON", param_list)
+        is_ok, *_ = self.send("VIRT_ON", virt_params_limit(*data))
         return is_ok and self.__last_rx_error == 0
 
     # turn off (only) data to virtual screen
     def cmd_virt_off(self, *data):
-        param_list = self.__cmd_virt_operation_sub(*data)
-        is_ok, *_ = self.send("VIRT_OFF", param_list)
+        is_ok, *_ = self.send("VIRT_OFF", virt_params_limit(*data))
         return is_ok and self.__last_rx_error == 0
 
     # toggle data on virtual screen
     def cmd_virt_toggle(self, *data):
-        param_list = self.__cmd_virt_operation_sub(*data)
-        is_ok, *_ = self.send("VIRT_TOGGLE", param_list)
+        is_ok, *_ = self.send("VIRT_TOGGLE", virt_params_limit(*data))
         return is_ok and self.__last_rx_error == 0
 
     # fill (1) or clear (0) whole virtual screen
@@ -478,22 +783,12 @@ class Uart:
 
     # show part of virtual screen on LED matrix
     def cmd_virt_show(self, *data):
-        param_list = General.vars_to_list(*data)
-        # limit value of XY position
-        if param_list[0] > Settings.VIRT_SCREEN_X_SIZE:
-            param_list[0] = Settings.VIRT_SCREEN_X_SIZE
-        if param_list[1] > Settings.VIRT_SCREEN_Y_SIZE:
-            param_list[1] = Settings.VIRT_SCREEN_Y_SIZE
-        # limit parameter roll
-        param_list[2] = int(param_list[2] != 0)
-
-        is_ok, *_ = self.send("VIRT_SHOW", param_list)
+        is_ok, *_ = self.send("VIRT_SHOW", virt_show_params_limit(*data))
         return is_ok and self.__last_rx_error == 0
 
     # assign specific function to pin in expander
     def cmd_exp_fn_set(self, *data):
-        if data[0] != 1 and data[0] != 2:
-            print("Incorrect pin number")
+        if not exp_pin_check(data[0]):
             return False
         is_ok, *_ = self.send("EXP_FN_SET", *data)
         return is_ok and self.__last_rx_error == 0
@@ -515,8 +810,7 @@ class Uart:
 
     # get pin state used as digital input
     def cmd_exp_io_in_get(self, *data):
-        if data[0] != 1 and data[0] != 2:
-            print("Incorrect pin number")
+        if not exp_pin_check(data[0]):
             return False
         is_ok, result = self.send("EXP_IO_IN_GET", data[0])
         if is_ok and self.__last_rx_error == 0:
@@ -528,8 +822,7 @@ class Uart:
     # set pin state used as digital output
     def cmd_exp_io_out_set(self, *data):
         param_list = General.vars_to_list(*data)
-        if param_list[0] != 1 and param_list[0] != 2:
-            print("Incorrect pin number")
+        if not exp_pin_check(param_list[0]):
             return False
         param_list[1] = int(param_list[1] != 0)
 
@@ -538,8 +831,7 @@ class Uart:
 
     # get analog value (voltage in [mV]) on pin of expander
     def cmd_exp_adc_get(self, *data):
-        if data[0] != 1 and data[0] != 2:
-            print("Incorrect pin number")
+        if not exp_pin_check(data[0]):
             return False
         is_ok, result = self.send("EXP_ADC_GET", data[0])
         if is_ok and self.__last_rx_error == 0:
@@ -551,8 +843,7 @@ class Uart:
     # set analog value (voltage in [mV]) on pin of expander
     def cmd_exp_dac_set(self, *data):
         param_list = General.vars_to_list(*data)
-        if param_list[0] != 1 and param_list[0] != 2:
-            print("Incorrect pin number")
+        if not exp_pin_check(param_list[0]):
             return False
 
         is_ok, *_ = self.send("EXP_DAC_SET", param_list)
@@ -0,0 +1,105 @@
+import numpy as np
+
+from libraries.EduSense import Settings
+from libraries.EduSense import Uart
+from libraries.EduSense.FrameBuffer import FrameBuffer
+
+# chars of VIRT_WRITE frame, which are left for pixels: everything, but STX, frame counter, command, ETX
+# and parameters x, y, width, height (bytes) and roll (nibble)
+VIRT_PIXEL_BYTES_MAX = (Uart.UART_DATA_SIZE_MAX - 1 - 2 - 2 - 1 - 1 - 4 * 2 - 1) // 2
+VIRT_MERGE_GAP = 8  # changed columns closer than this are sent in one rectangle
+
+
+# Host side copy of virtual screen of pad (Settings.VIRT_SCREEN_X_SIZE x Settings.VIRT_SCREEN_Y_SIZE).
+# Draw on <frame> (FrameBuffer) and call <update>: only rectangles, which differ from what was sent before,
+# are sent to pad. Scrolling is done by moving the part of screen shown on LED matrix (VIRT_SHOW),
+# so pixels don't have to be sent again.
+class VirtScreen:
+    def __init__(self, port):
+        self._port = port
+        self.frame = FrameBuffer(Settings.VIRT_SCREEN_X_SIZE, Settings.VIRT_SCREEN_Y_SIZE)
+        self._uploaded = np.zeros_like(self.frame.pixels)  # what (we know) is on pad
+        self._view = None  # (x, y, roll) shown on LED matrix
+        self._view_todo = (0, 0, False)
+
+        # statistics
+        self.frames_sent = 0
+        self.pixel_bytes_sent = 0
+
+    # forget what was sent, so whole screen will be sent during next update
+    def invalidate(self):
+        self._uploaded = ~self.frame.pixels
+        self._view = None
+
+    # clear virtual screen on pad and on host
+    def clear(self):
+        self.frame.clear()
+        if self._port.cmd_virt_fill(0):
+            self._uploaded[:] = False
+
+    # which part of virtual screen will be shown on LED matrix
+    def view_set(self, x, y, roll=False):
+        self._view_todo = (x, y, bool(roll))
+
+    def view_get(self):
+        return self._view_todo
+
+    def scroll(self, dx, dy=0, roll=True):
+        x, y, _ = self._view_todo
+        if roll:
+            x %= Settings.VIRT_SCREEN_X_SIZE
+            y %= Settings.VIRT_SCREEN_Y_SIZE
+            self._view_todo = ((x + dx) % Settings.VIRT_SCREEN_X_SIZE, (y + dy) % Settings.VIRT_SCREEN_Y_SIZE, True)
+        else:
+            self._view_todo = (max(0, x + dx), max(0, y + dy), False)
+
+    # list of rectangles (x, y, width, height) which have to be sent
+    def dirty_rects_get(self):
+        diff = self.frame.pixels ^ self._uploaded
+        columns = np.flatnonzero(diff.any(axis=1))
+        if not len(columns):
+            return []
+
+        # join changed columns into groups, if gap between them is small
+        breaks = np.flatnonzero(np.diff(columns) > VIRT_MERGE_GAP)
+        starts = np.concatenate(([columns[0]], columns[breaks + 1]))
+        ends = np.concatenate((columns[breaks], [columns[-1]])) + 1
+
+        rects = []
+        for x0, x1 in zip(starts.tolist(), ends.tolist()):
+            rows = np.flatnonzero(diff[x0:x1].any(axis=0))
+            rects.append((x0, int(rows[0]), x1 - x0, int(rows[-1]) - int(rows[0]) + 1))
+        return rects
+
+    # send changed pixels and position of view
+    def update(self):
+        pixels = self.frame.pixels
+        rects = self.dirty_rects_get()
+
+        # whole screen is the same colour - one VIRT_FILL is cheaper than sending pixels
+        if rects and (not pixels.any() or pixels.all()):
+            if self._port.cmd_virt_fill(int(pixels[0, 0])):
+                self.frames_sent += 1
+                self._uploaded[:] = pixels
+                rects = []
+
+        for x, y, width, height in rects:
+            self.__rect_send(x, y, width, height)
+
+        if self._view != self._view_todo:
+            if self._port.cmd_virt_show(*self._view_todo):
+                self.frames_sent += 1
+                self._view = self._view_todo
+
+    def __rect_send(self, x, y, width, height):
+        bytes_per_column = (height + 7) // 8
+        columns_max = VIRT_PIXEL_BYTES_MAX // bytes_per_column
+        for chunk_x in range(x, x + width, columns_max):
+            chunk_width = min(columns_max, x + width - chunk_x)
+            region = self.frame.pixels[chunk_x: chunk_x + chunk_width, y: y + height]
+            # column by column, bit 0 of the first byte of column is the top pixel
+            data = np.packbits(region, axis=1, bitorder="little").ravel().tolist()
+            if self._port.cmd_virt_write([chunk_x, y, chunk_width, height, 0] + data):
+                self.frames_sent += 1
+                self.pixel_bytes_sent += len(data)
+                self._uploaded[chunk_x: chunk_x + chunk_width, y: y + height] = region
@@ -1,16 +1,25 @@
 # Gra z książki "Koduj w Pythonie" z implementacją DualSense
 
-from time import sleep
+import sys
 from datetime import datetime
-from turtledemo import clock
 
-import pgzrun
-from pgzero import music, screen
-from pgzero.actor import Actor
-from pgzero.animation import animate
-from pgzero.loaders import sounds
-# from dualsense_controller import DualSenseController
-from pydualsense import *  # Import biblioteki PyDualSense dla kontrolera
+# tryb bez okna, dźwięku i kontrolera: python main.py --headless (szczegóły w simulation.py)
+HEADLESS = "--headless" in sys.argv
+
+if HEADLESS:
+    import simulation
+    from simulation import Actor, animate, clock, monotonic, music, screen, sounds
+else:
+    from time import monotonic
+
+    import pgzrun
+    from pgzero import music, screen
+    from pgzero.actor import Actor
+    from pgzero.animation import animate
+    from pgzero.clock import clock
+    from pgzero.loaders import sounds
+    # from dualsense_controller import DualSenseController
+    from pydualsense import *  # Import biblioteki PyDualSense dla kontrolera
 
 # is_running = True
 # controller = DualSenseController()
@@ -31,7 +40,12 @@ def on_dpadDown_btn_released():
 """
 
 # Stworzenie i inicjalizacja kontrolera DualSense do gry
-dualsense = pydualsense()
+if HEADLESS:
+    # w trybie headless przyciski naciska skrypt
+    simulation_args = simulation.parse_args(sys.argv[1:])
+    dualsense = simulation.make_controller(simulation_args)
+else:
+    dualsense = pydualsense()
 dualsense.init()
 
 # Do eksperymentowania
@@ -39,6 +53,78 @@ dualsense.init()
 # dualsense.light.setColorI(255,0,0) # Kolor czerwony
 
 
+# Wibracje kontrolera
+HAPTICS_TICK_TIME = 1 / 60  # [s] co tyle zmieniamy moc silników, gdy trwa wibracja
+
+# wzorzec wibracji to para obwiedni: dla lewego (mocniejszego) i prawego silnika,
+# obwiednia to lista punktów (czas od startu [s], moc 0..255), pomiędzy nimi moc zmienia się liniowo
+HAPTICS_STEP = (((0, 0),), ((0, 70), (0.04, 0)))  # krótkie stuknięcie przy kroku
+HAPTICS_SEARCH = (((0, 120), (0.05, 0)), ((0, 120), (0.05, 0)))  # szukanie klucza (to co było wcześniej)
+HAPTICS_KEY = (((0, 255), (0.08, 255), (0.09, 0), (0.16, 0), (0.17, 255), (0.25, 255), (0.26, 0)),
+               ((0, 200), (0.25, 200), (0.26, 0)))  # znaleziony klucz - dwa mocne impulsy
+HAPTICS_DOOR = (((0, 0), (0.15, 255), (0.45, 0)), ((0, 80), (0.3, 0)))  # drzwi - narastające dudnienie
+
+
+def envelope_value(envelope, time):
+    # moc silnika w chwili <time> od startu obwiedni
+    if time <= envelope[0][0]:
+        return envelope[0][1]
+    for (time_0, value_0), (time_1, value_1) in zip(envelope, envelope[1:]):
+        if time <= time_1:
+            return round(value_0 + (value_1 - value_0) * (time - time_0) / (time_1 - time_0))
+    return envelope[-1][1]
+
+
+def pattern_duration(pattern):
+    return max(envelope[-1][0] for envelope in pattern)
+
+
+class Haptics:
+    """ odtwarza wzorce wibracji zegarem gry, więc update() nigdy nie czeka na koniec wibracji """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.playing = []  # lista par (wzorzec, czas startu)
+        self.motors = (0, 0)  # moc ustawiona teraz na silnikach (lewy, prawy)
+
+    def play(self, pattern, restart=True):
+        # bez <restart> wzorzec, który już trwa, nie jest dodawany drugi raz (np. przy trzymanym przycisku)
+        if not restart and self.is_playing(pattern):
+            return
+        self.playing.append((pattern, monotonic()))
+        self.tick()
+
+    def is_playing(self, pattern=None):
+        return any(pattern is None or playing is pattern for playing, _ in self.playing)
+
+    def stop(self):
+        clock.unschedule(self.tick)
+        self.playing = []
+        self.motors_set(0, 0)
+
+    def tick(self):
+        now = monotonic()
+        self.playing = [(pattern, start) for pattern, start in self.playing
+                        if now - start <= pattern_duration(pattern)]
+        # wzorce, które nakładają się w czasie, łączymy - każdy silnik dostaje największą z mocy
+        left = max((envelope_value(pattern[0], now - start) for pattern, start in self.playing), default=0)
+        right = max((envelope_value(pattern[1], now - start) for pattern, start in self.playing), default=0)
+        self.motors_set(left, right)
+        if self.playing:
+            clock.schedule_unique(self.tick, HAPTICS_TICK_TIME)
+
+    def motors_set(self, left, right):
+        # do kontrolera wysyłamy tylko zmiany
+        if left != self.motors[0]:
+            self.controller.setLeftMotor(left)
+        if right != self.motors[1]:
+            self.controller.setRightMotor(right)
+        self.motors = (left, right)
+
+
+haptics = Haptics(dualsense)
+
+
 WIDTH = 1280
 HEIGHT = 640
 TITLE = "Maks - gra przygodowa"
@@ -223,6 +309,7 @@ class Game:
         # gramy dźwięk co 4 'kroki'
         if self.hero.frame == 4 or self.hero.frame == 8:
             sounds.walk.play()
+            haptics.play(HAPTICS_STEP)
 
     def enter_door(self):
         # pobieramy element słownika
@@ -238,6 +325,7 @@ class Game:
                     self.shift_ok = False
                     # odtwarzamy dźwięk otwierania drzwi
                     sounds.door.play()
+                    haptics.play(HAPTICS_DOOR)
                     # pobieramy nowy numer pomieszczenia i nazwę pliku tła
                     new_room = door.next_room_number
                     new_background_image = self.rooms[new_room].file_name
@@ -290,8 +378,11 @@ class Game:
                 key.in_pocket = True
                 # odtwarzamy dźwięk dzwonienia kluczy
                 sounds.key.play()
+                haptics.play(HAPTICS_KEY)
                 # i sprawdzamy, czy znaleźliśmy już wszystkie klucze
                 self.all_keys_found = check_all_keys(self.keys_in_pocket)
+                return True
+        return False
 
     def update_game(self):
         """ ta metoda będzie wywoływana z funkcji update() programu głównego, co 5 sekund"""
@@ -302,6 +393,7 @@ class Game:
             self.start_time = datetime.now()
 
         if dualsense.state.circle:
+            haptics.stop()
             dualsense.close()  # Zamknięcie kontrolera
             sys.exit("Exiting the game.")
 
@@ -313,12 +405,9 @@ class Game:
             if dualsense.state.DpadUp:
                 self.enter_door()
             if dualsense.state.DpadDown:
-                self.get_key()
-                dualsense.setLeftMotor(255)   # Wibracje
-                dualsense.setRightMotor(255)  # Wibracje
-                sleep(0.05)
-                dualsense.setLeftMotor(0)   # Wibracje
-                dualsense.setRightMotor(0)  # Wibracje
+                # wibracje grają w tle, nie zatrzymujemy gry
+                if not self.get_key():
+                    haptics.play(HAPTICS_SEARCH, restart=False)
             if self.all_keys_found:
                 self.show_hidden_door = True
             if self.actual_room == 13 and self.enter_last_door:
@@ -468,4 +557,8 @@ def draw():
     game.draw_scene()
 
 
-pgzrun.go()
+if HEADLESS:
+    # bez okna - kręcimy update() tak szybko, jak się da i na końcu wypisujemy pomiary
+    simulation.run(game, dualsense, simulation_args.ticks)
+else:
+    pgzrun.go()
@@ -0,0 +1,215 @@
+# Tryb bez okna, dźwięku i kontrolera (headless) dla klasy Game z main.py
+#
+# Uruchomienie:  python main.py --headless [--ticks N] [--seed S] [--script plik.txt]
+#
+# Zamiast pgzero i pydualsense używamy tu prostych zamienników, które nic nie rysują
+# i nic nie odtwarzają, a czas gry jest symulowany (1/60 s na klatkę), więc pętla
+# update() kręci się tak szybko, jak pozwala procesor.
+
+import argparse
+import random
+from time import perf_counter
+
+TICK_TIME = 1 / 60  # [s] tyle symulowanego czasu trwa jedna klatka (jak w pgzero)
+
+# nazwy przycisków takie same jak w dualsense.state
+BUTTONS = ("cross", "circle", "DpadUp", "DpadDown", "DpadLeft", "DpadRight")
+
+# metody klasy Game, dla których mierzymy czas wykonania
+PROFILED_METHODS = ("update_game", "hero_move", "enter_door", "get_key")
+
+
+class SimClock:
+    """ symulowany zegar - zamiennik pgzero.clock """
+
+    def __init__(self):
+        self.now = 0.0
+        self._scheduled = {}
+
+    def schedule_unique(self, callback, delay):
+        self._scheduled[callback] = self.now + delay
+
+    def unschedule(self, callback):
+        self._scheduled.pop(callback, None)
+
+    def tick(self, dt):
+        self.now += dt
+        if self._scheduled:
+            for callback, due in list(self._scheduled.items()):
+                if due <= self.now:
+                    del self._scheduled[callback]
+                    callback()
+
+
+clock = SimClock()
+
+
+def monotonic():
+    # zamiennik time.monotonic - czas symulowany
+    return clock.now
+
+
+class Actor:
+    """ zamiennik pgzero.actor.Actor - pamięta tylko położenie i nazwę obrazka """
+
+    def __init__(self, image, pos=(0, 0), **kwargs):
+        self.image = image
+        self.x, self.y = pos
+        self.width = 0
+        self.height = 0
+
+    @property
+    def pos(self):
+        return self.x, self.y
+
+    @pos.setter
+    def pos(self, value):
+        self.x, self.y = value
+
+    def draw(self):
+        pass
+
+
+class _Silent:
+    """ obiekt, który na każde wywołanie nic nie robi (dźwięki, muzyka, ekran) """
+
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+
+sounds = _Silent()
+music = _Silent()
+screen = _Silent()
+
+
+def animate(*args, **kwargs):
+    pass
+
+
+class ControllerState:
+    def __init__(self):
+        for button in BUTTONS:
+            setattr(self, button, False)
+
+
+class ScriptedController:
+    """ zamiennik pydualsense - przyciski naciska skrypt, a nie gracz """
+
+    def __init__(self, script):
+        # skrypt to lista par (liczba klatek, zbiór wciśniętych przycisków)
+        self.state = ControllerState()
+        self._steps = [step for step in script if step[0] > 0]
+        self._step = 0
+        self._ticks_left = self._steps[0][0] if self._steps else 0
+
+    def init(self):
+        pass
+
+    def close(self):
+        pass
+
+    def setLeftMotor(self, intensity):
+        pass
+
+    def setRightMotor(self, intensity):
+        pass
+
+    def tick(self):
+        if not self._steps:
+            return
+        # po wykonaniu całego skryptu zaczynamy od nowa
+        while self._ticks_left <= 0:
+            self._step = (self._step + 1) % len(self._steps)
+            self._ticks_left = self._steps[self._step][0]
+        pressed = self._steps[self._step][1]
+        for button in BUTTONS:
+            setattr(self.state, button, button in pressed)
+        self._ticks_left -= 1
+
+
+def load_script(file_name):
+    # każda linia pliku: <liczba klatek> [przycisk przycisk ...], np. "40 DpadRight"
+    # pusta lista przycisków (albo "-") oznacza klatki bez wciśniętego przycisku
+    script = []
+    with open(file_name, encoding="utf-8") as file:
+        for line in file:
+            line = line.split("#")[0].split()
+            if not line:
+                continue
+            pressed = frozenset(x for x in line[1:] if x != "-")
+            unknown = pressed.difference(BUTTONS)
+            if unknown:
+                raise ValueError(f"Nieznany przycisk w skrypcie: {', '.join(sorted(unknown))}")
+            script.append((int(line[0]), pressed))
+    return script
+
+
+def random_script(seed, steps=1000):
+    # start gry krzyżykiem, potem losowe chodzenie, wchodzenie w drzwi i zbieranie kluczy
+    rnd = random.Random(seed)
+    script = [(1, frozenset({"cross"}))]
+    moves = ("DpadLeft", "DpadRight", "DpadRight", "DpadUp", "DpadDown")
+    for _ in range(steps):
+        script.append((rnd.randint(1, 60), frozenset({rnd.choice(moves)})))
+        script.append((rnd.randint(0, 10), frozenset()))
+    return script
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Gra w trybie headless (bez okna, dźwięku i kontrolera)")
+    parser.add_argument("--headless", action="store_true")
+    parser.add_argument("--ticks", type=int, default=1_000_000, help="liczba klatek do zasymulowania")
+    parser.add_argument("--seed", type=int, default=0, help="ziarno losowego skryptu")
+    parser.add_argument("--script", help="plik ze skryptem naciskanych przycisków")
+    return parser.parse_args(argv)
+
+
+def make_controller(args):
+    script = load_script(args.script) if args.script else random_script(args.seed)
+    return ScriptedController(script)
+
+
+def _profiled(method, stats):
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stats[0] += 1
+            stats[1] += perf_counter() - start
+    return wrapper
+
+
+def run(game, controller, ticks):
+    # podmieniamy metody instancji na wersje mierzące czas
+    stats = {}
+    for name in PROFILED_METHODS:
+        stats[name] = [0, 0.0]
+        setattr(game, name, _profiled(getattr(game, name), stats[name]))
+
+    done = 0
+    start = perf_counter()
+    try:
+        for done in range(1, ticks + 1):
+            controller.tick()
+            game.update_game()
+            clock.tick(TICK_TIME)
+    except SystemExit:
+        # skrypt nacisnął kółko - gra sama się zakończyła
+        pass
+    elapsed = perf_counter() - start
+
+    report(done, elapsed, stats)
+    return stats
+
+
+def report(ticks, elapsed, stats):
+    print(f"Klatek: {ticks}, czas: {elapsed:.3f} s, "
+          f"klatek na sekundę: {ticks / elapsed if elapsed else 0:.0f}")
+    print(f"{'metoda':<12} {'wywołań':>10} {'razem [s]':>11} {'średnio [us]':>13}")
+    for name, (calls, total) in stats.items():
+        mean = total / calls * 1e6 if calls else 0
+        print(f"{name:<12} {calls:>10} {total:>11.3f} {mean:>13.2f}")